@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import List
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent / 'src' / 'plugin'
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from cider_api import decoding  # noqa: E402
+from cider_api.media import Media  # noqa: E402
+
+CATEGORIES = ['songs', 'albums', 'artists', 'playlists']
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Compare JSON backends on recorded searchResults frames')
+    parser.add_argument('frames', nargs='*', type=Path,
+                        help='Recorded frames, one JSON message per file')
+    parser.add_argument('--items', type=int, default=100,
+                        help='Items per category in the synthetic frame')
+    parser.add_argument('--number', type=int, default=50)
+    return parser.parse_args()
+
+
+def synthetic_frame(items: int) -> bytes:
+    def item(i: int, category: str) -> dict:
+        kind = category[:-1]
+        return {
+            'id': str(i), 'type': category, 'href': f'/v1/catalog/us/{category}/{i}',
+            'attributes': {
+                'name': f'{kind} {i}', 'artistName': 'Artist', 'albumName': 'Album',
+                'genreNames': ['Alternative', 'Music'],
+                'artwork': {'width': 3000, 'height': 3000, 'bgColor': 'ffffff',
+                            'url': 'https://is1-ssl.mzstatic.com/image/thumb/{w}x{h}bb.jpg'},
+                'playParams': {'id': str(i), 'kind': kind},
+                'previews': [{'url': 'https://audio-ssl.itunes.apple.com/preview.m4a'}],
+                'editorialNotes': {'short': 'x' * 200, 'standard': 'y' * 800},
+                'audioTraits': ['lossless', 'lossy-stereo'],
+                'url': f'https://music.apple.com/us/{kind}/{i}',
+            },
+        }
+    data = {category: {'href': '', 'next': '', 'data': [item(i, category) for i in range(items)]}
+            for category in CATEGORIES}
+    data['meta'] = {'results': {'order': CATEGORIES}}
+    return json.dumps({'status': 0, 'message': '', 'type': 'searchResults', 'data': data}).encode()
+
+
+def decode_search(loads, frame: bytes) -> List[Media]:
+    data = loads(frame)['data']
+    return [Media.from_attributes(item['attributes'])
+            for category in ('songs', 'albums') if data.get(category)
+            for item in data[category]['data']]
+
+
+def main(args: argparse.Namespace) -> None:
+    frames = {str(path): path.read_bytes() for path in args.frames}
+    if not frames:
+        frames[f'synthetic ({args.items} per category)'] = synthetic_frame(args.items)
+    backends = {'json': json.loads}
+    if decoding.orjson is not None:
+        backends['orjson'] = decoding.orjson.loads
+    else:
+        print('orjson is not installed, only timing the standard library')
+    for name, frame in frames.items():
+        print(f'{name}: {len(frame) / 1024:.0f} KiB')
+        for backend, loads in backends.items():
+            seconds = timeit.timeit(
+                lambda: decode_search(loads, frame), number=args.number)
+            print(f'  {backend:<8}{seconds / args.number * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main(parse_args())
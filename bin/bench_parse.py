@@ -0,0 +1,43 @@
+"""Time parse_query against the argparse parser it replaced."""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent / 'src' / 'plugin'
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from parse_args import FLAG_CHAR, parse_query  # noqa: E402
+
+QUERIES = ['radiohead', 'ok computer :by radiohead :limit 10',
+           'airbag :type songs', 'radiohead :ty']
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Time parsing queries')
+    parser.add_argument('queries', nargs='*', default=QUERIES)
+    parser.add_argument('--number', type=int, default=2000)
+    return parser.parse_args()
+
+
+def argparse_query(input: str) -> argparse.Namespace:
+    # How queries were parsed before parse_query.
+    parser = argparse.ArgumentParser(prefix_chars=FLAG_CHAR, add_help=False)
+    parser.add_argument('query', type=str, nargs='*')
+    parser.add_argument(':limit', type=int, default=20, nargs='?')
+    parser.add_argument(':by', type=str, nargs='?')
+    parser.add_argument(':type', type=str, nargs='?')
+    return parser.parse_intermixed_args(input.split())
+
+
+def main(args: argparse.Namespace) -> None:
+    for name, parse in (('argparse', argparse_query),
+                        ('parse_query', parse_query.__wrapped__),
+                        ('parse_query (cached)', parse_query)):
+        seconds = timeit.timeit(
+            lambda: [parse(query) for query in args.queries], number=args.number)
+        print(f'{name:<22}{seconds / args.number / len(args.queries) * 1e6:8.1f} us/query')
+
+
+if __name__ == '__main__':
+    main(parse_args())
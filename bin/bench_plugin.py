@@ -0,0 +1,165 @@
+"""End to end latency of FlowCider against the mock Cider server.
+
+Each search phrase is typed one character at a time through
+FlowCider.query, after which the context menu of the first result is
+opened, as a user picking a track would. Latency percentiles and
+throughput are reported per call, and --max-p95 fails the run when the
+query p95 regresses past a budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src' / 'plugin'))
+
+from debounce import Debouncer  # noqa: E402
+from mock_cider import FIXTURES, MockCider, MockCiderServer  # noqa: E402
+
+PHRASES = [
+    'radiohead',
+    'karma police',
+    'ok computer :type albums',
+    'get lucky :by daft',
+    'daft punk :type artists',
+    'fleetwood mac dreams',
+    'essentials :type playlists',
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark FlowCider.query and context_menu on typed queries')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='Times every phrase is typed')
+    parser.add_argument('--latency', type=float, default=5,
+                        help='Milliseconds the mock waits before every reply')
+    parser.add_argument('--jitter', type=float, default=5)
+    parser.add_argument('--push-interval', type=float, default=0.5)
+    parser.add_argument('--push-ratio', type=float, default=0.2)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES)
+    parser.add_argument('--port', type=int,
+                        help='Use a server already listening here instead of the mock')
+    parser.add_argument('--debounce', action='store_true',
+                        help='Include the debounce delay in query latency')
+    parser.add_argument('--cold', action='store_true',
+                        help='Build a new FlowCider for every call, as Flow does')
+    parser.add_argument('--max-p95', type=float,
+                        help='Exit with an error if the query p95 exceeds this many ms')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def plugin_class(data_dir: Path):
+    # flox finds Flow Launcher from the working directory when imported.
+    flow_dir = Path(os.getenv('APPDATA', Path.home() / 'AppData' / 'Roaming')) / 'FlowLauncher'
+    if 'flowlauncher' not in str(Path.cwd()).lower() and flow_dir.is_dir():
+        os.chdir(flow_dir)
+    from main import FlowCider
+
+    class BenchFlowCider(FlowCider):
+        plugindir = str(ROOT / 'src')
+        user_keyword = 'fc'
+        settings_path = str(data_dir / 'Settings.json')
+
+        def run(self, debug=None):
+            # Flox answers sys.argv from __del__, there is no request here.
+            pass
+
+    return BenchFlowCider
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def report(name: str, samples: List[float], elapsed: float) -> Dict[str, float]:
+    stats = {
+        'p50': percentile(samples, 50) * 1000,
+        'p95': percentile(samples, 95) * 1000,
+        'p99': percentile(samples, 99) * 1000,
+        'mean': statistics.mean(samples) * 1000,
+        'per_second': len(samples) / elapsed if elapsed else 0.0,
+    }
+    print(f'{name:<14}{len(samples):>6} calls  p50 {stats["p50"]:7.2f} ms  '
+          f'p95 {stats["p95"]:7.2f} ms  p99 {stats["p99"]:7.2f} ms  '
+          f'{stats["per_second"]:8.1f}/s')
+    return stats
+
+
+def main(args: argparse.Namespace) -> int:
+    server: Optional[MockCiderServer] = None
+    port = args.port
+    if port is None:
+        server = MockCiderServer(MockCider(
+            args.fixtures, args.latency, args.jitter,
+            args.push_interval, args.push_ratio, args.seed)).start()
+        port = server.port
+    with tempfile.TemporaryDirectory() as data_dir:
+        (Path(data_dir) / 'Settings.json').write_text(json.dumps({'port': port}))
+        FlowCider = plugin_class(Path(data_dir))
+
+        def new_plugin():
+            plugin = FlowCider()
+            # Artwork lives on Apple's CDN, which would only time network access.
+            plugin.prefetcher.sizes = ()
+            if not args.debounce:
+                plugin.debouncer = Debouncer(min_delay=0, max_delay=0)
+            return plugin
+
+        plugin = new_plugin()
+        timings: Dict[str, List[float]] = {'query': [], 'context_menu': []}
+        elapsed = dict.fromkeys(timings, 0.0)
+
+        def call(name: str, *params) -> List[Dict]:
+            nonlocal plugin
+            if args.cold:
+                plugin.cider.close()
+                plugin = new_plugin()
+            plugin._results = []
+            start = time.perf_counter()
+            getattr(plugin, name)(*params)
+            seconds = time.perf_counter() - start
+            timings[name].append(seconds)
+            elapsed[name] += seconds
+            return plugin._results
+
+        for _ in range(args.rounds):
+            for phrase in PHRASES:
+                results: List[Dict] = []
+                for end in range(1, len(phrase) + 1):
+                    results = call('query', phrase[:end])
+                # Search results are rendered to JSON fragments.
+                results = [json.loads(result) if isinstance(result, str) else result
+                           for result in results]
+                context = next((result['ContextData'] for result in results
+                                if result.get('ContextData')), None)
+                if context:
+                    call('context_menu', context)
+        # Let background refreshes and prefetches finish while the server is up.
+        plugin.prefetcher.shutdown()
+        for thread in threading.enumerate():
+            if thread is not threading.current_thread() and not thread.daemon:
+                thread.join()
+        plugin.cider.close()
+    if server is not None:
+        server.stop()
+    stats = {name: report(name, samples, elapsed[name])
+             for name, samples in timings.items() if samples}
+    if args.max_p95 is not None and stats['query']['p95'] > args.max_p95:
+        print(f'query p95 {stats["query"]["p95"]:.2f} ms is over the '
+              f'{args.max_p95:.2f} ms budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
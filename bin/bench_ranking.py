@@ -0,0 +1,40 @@
+"""Time Ranker.rank on random candidates, as many as a search returns."""
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent / 'src' / 'plugin'
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from cider_api.media import Media  # noqa: E402
+from cider_api.ranking import Ranker  # noqa: E402
+
+WORDS = 'airbag paranoid android karma police lucky exit music no surprises'.split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Time ranking search results')
+    parser.add_argument('--term', default='karma pol')
+    parser.add_argument('--counts', type=int, nargs='+', default=[50, 100, 300])
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    count = max(args.counts)
+    medias = [Media(str(i), rng.choice(['song', 'album']),
+                    ' '.join(rng.sample(WORDS, 3)), ' '.join(rng.sample(WORDS, 2)))
+              for i in range(count)]
+    ranker = Ranker({str(i) for i in range(0, count, 7)})
+    for count in args.counts:
+        seconds = min(timeit.repeat(
+            lambda: ranker.rank(args.term, medias[:count]), number=args.number, repeat=5))
+        print(f'{count:>4} candidates {seconds / args.number * 1e3:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main(parse_args())
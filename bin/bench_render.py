@@ -0,0 +1,82 @@
+"""Cost per result of serializing search results for Flow.
+
+Compares building flox's add_item dicts and dumping them, as
+search_results used to, with ResultRenderer, both the first time it
+sees the media and once their fragments are cached.
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Dict, List
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent / 'src' / 'plugin'
+sys.path.insert(0, str(PLUGIN_DIR))
+
+from cider_api.media import Media  # noqa: E402
+from render import ResultRenderer, dumps  # noqa: E402
+
+KEYWORD = 'fc'
+ICON = str(PLUGIN_DIR.parent / 'icon.png')
+
+
+def medias(count: int) -> List[Media]:
+    return [Media(str(i), 'song' if i % 3 else 'album', f'Song {i}', 'Radiohead',
+                  'https://is1-ssl.mzstatic.com/image/thumb/Music/{w}x{h}bb.jpg',
+                  'OK Computer', ('Alternative', 'Music'))
+            for i in range(count)]
+
+
+def flox_item(media: Media, score: int, query: list) -> Dict:
+    # What flox's add_item built from search_results' arguments.
+    icon = media.artwork(32, 32) or ICON
+    if not Path(icon).is_absolute():
+        icon = Path(PLUGIN_DIR, icon)
+    return {
+        'Title': str(media.name),
+        'SubTitle': str(f'by {media.artist_name} ({media.kind})'),
+        'IcoPath': str(icon),
+        'ContextData': [media.to_payload(), *query],
+        'Score': score,
+        'JsonRPCAction': {'method': 'play_media', 'parameters': [media.to_payload()],
+                          'dontHideAfterAction': False},
+        'AutoCompleteText': f'{KEYWORD} {media.name}'.replace('* ', ''),
+        'Preview': {'PreviewImagePath': media.artwork(512, 512)},
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Time serializing search results to Flow JSON')
+    parser.add_argument('--counts', type=int, nargs='+', default=[20, 100, 500])
+    parser.add_argument('--number', type=int, default=50)
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace) -> None:
+    query = ['radiohead', 20, None]
+    for count in args.counts:
+        items = medias(count)
+        warm = ResultRenderer(KEYWORD, ICON)
+
+        def render(renderer: ResultRenderer) -> str:
+            return dumps({'result': renderer.results(
+                ((media, (count - i) * 10) for i, media in enumerate(items)), query)})
+
+        render(warm)
+        timings = {
+            'flox dicts': lambda: json.dumps({'result': [
+                flox_item(media, (count - i) * 10, query) for i, media in enumerate(items)]}),
+            'renderer': lambda: render(ResultRenderer(KEYWORD, ICON)),
+            'cached': lambda: render(warm),
+        }
+        print(f'{count} results')
+        for name, run in timings.items():
+            seconds = min(timeit.repeat(run, number=args.number, repeat=3)) / args.number
+            print(f'  {name:<12}{seconds / count * 1e6:8.2f} us per result'
+                  f'{seconds * 1000:9.3f} ms')
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,165 @@
+"""Import time of the plugin and cold start latency of its requests.
+
+Flow starts a new plugin process for every request, so whatever main
+imports is paid before each answer. This runs ``python -X importtime``
+on main a few times and lists the slowest modules, then times whole
+requests in fresh processes against the mock Cider server, from spawn
+until stdout closes, which is when Flow has the response. Either fails
+the run when it goes over its budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+PLUGIN = ROOT / 'src' / 'plugin'
+sys.path.insert(0, str(PLUGIN))
+
+# Flow requests timed in a fresh process, by name.
+REQUESTS = {
+    'now_playing': {'method': 'query', 'parameters': ['']},
+    'query': {'method': 'query', 'parameters': ['radiohead']},
+}
+
+# Runs in the fresh process. Artwork prefetch and debouncing are turned
+# off as in bench_plugin.py, they only add network access and waiting.
+CHILD = '''
+import os, sys
+sys.path.insert(0, {plugin!r})
+os.chdir({flow_dir!r})
+from main import FlowCider
+from debounce import Debouncer
+
+class ColdFlowCider(FlowCider):
+    plugindir = {src!r}
+    user_keyword = 'fc'
+    settings_path = {settings!r}
+
+sys.argv[1:] = [{request!r}]
+plugin = ColdFlowCider()
+plugin.prefetcher.sizes = ()
+plugin.debouncer = Debouncer(min_delay=0, max_delay=0)
+# Flox answers the request when the plugin is collected.
+del plugin
+'''
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Report import time of the plugin and time cold requests')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Processes started for each measurement')
+    parser.add_argument('--top', type=int, default=15,
+                        help='Slowest modules listed')
+    parser.add_argument('--budget', type=float, default=100,
+                        help='Most milliseconds importing main may take')
+    parser.add_argument('--cold-budget', type=float, default=250,
+                        help='Most milliseconds a cold request may take')
+    parser.add_argument('--port', type=int,
+                        help='Use a server already listening here instead of the mock')
+    parser.add_argument('--imports-only', action='store_true',
+                        help='Skip timing cold requests')
+    return parser.parse_args()
+
+
+def flow_dir() -> Path:
+    # flox finds Flow Launcher from the working directory when imported.
+    path = Path(os.getenv('APPDATA', Path.home() / 'AppData' / 'Roaming')) / 'FlowLauncher'
+    if not path.is_dir():
+        raise SystemExit(f'Flow Launcher is not installed at {path}')
+    return path
+
+
+def import_times() -> Tuple[float, Dict[str, float]]:
+    """Cumulative microseconds importing main and every module it pulls in"""
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(
+        filter(None, [str(PLUGIN), os.getenv('PYTHONPATH')]))}
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=flow_dir(), env=env, capture_output=True, text=True, check=True)
+    modules: Dict[str, float] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = float(cumulative)
+    return modules.pop('main'), modules
+
+
+def report_imports(runs: int, top: int) -> float:
+    totals: List[float] = []
+    fastest: Dict[str, float] = {}
+    for _ in range(runs):
+        total, modules = import_times()
+        totals.append(total)
+        for name, cumulative in modules.items():
+            # The fastest run of a module is the least disturbed by noise.
+            fastest[name] = min(cumulative, fastest.get(name, cumulative))
+    for name, cumulative in sorted(fastest.items(), key=lambda item: -item[1])[:top]:
+        print(f'{cumulative / 1000:8.2f} ms  {name}')
+    median = statistics.median(totals) / 1000
+    print(f'import main   median {median:7.2f} ms  min {min(totals) / 1000:7.2f} ms')
+    return median
+
+
+def cold_request(request: Dict, data_dir: Path, port: int) -> float:
+    """Seconds from starting a plugin process until it closes stdout"""
+    settings = data_dir / 'Settings.json'
+    settings.write_text(json.dumps({'port': port}))
+    code = CHILD.format(plugin=str(PLUGIN), flow_dir=str(flow_dir()), src=str(ROOT / 'src'),
+                        settings=str(settings), request=json.dumps(request))
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE)
+    output = process.stdout.read()
+    seconds = time.perf_counter() - start
+    process.wait()
+    if process.returncode or 'result' not in json.loads(output or b'{}'):
+        raise RuntimeError(f'{request} failed: {output[:200]!r}')
+    return seconds
+
+
+def report_requests(runs: int, port: Optional[int]) -> Dict[str, float]:
+    server = None
+    if port is None:
+        from mock_cider import MockCider, MockCiderServer
+        server = MockCiderServer(MockCider()).start()
+        port = server.port
+    medians = {}
+    try:
+        for name, request in REQUESTS.items():
+            # Caches are kept between runs of a request, as they are in use.
+            with tempfile.TemporaryDirectory() as data_dir:
+                samples = [cold_request(request, Path(data_dir), port) for _ in range(runs)]
+            medians[name] = statistics.median(samples) * 1000
+            print(f'{name:<14}median {medians[name]:7.2f} ms  '
+                  f'first {samples[0] * 1000:7.2f} ms  max {max(samples) * 1000:7.2f} ms')
+    finally:
+        if server is not None:
+            server.stop()
+    return medians
+
+
+def main(args: argparse.Namespace) -> int:
+    failed = False
+    total = report_imports(args.runs, args.top)
+    if total > args.budget:
+        print(f'import main {total:.2f} ms is over the {args.budget:.2f} ms budget')
+        failed = True
+    if not args.imports_only:
+        print()
+        for name, median in report_requests(args.runs, args.port).items():
+            if median > args.cold_budget:
+                print(f'{name} {median:.2f} ms is over the {args.cold_budget:.2f} ms budget')
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -0,0 +1,283 @@
+"""Local stand-in for Cider's WebSocket API.
+
+Replies are built from the recorded fixtures in bin/fixtures, which follow
+the shapes in src/plugin/cider_api/_responses. The server can add latency
+and jitter to every reply and send unsolicited playbackStateUpdate frames,
+both on a timer and right before replies, the way Cider does while a
+track plays.
+"""
+import argparse
+import base64
+import copy
+import hashlib
+import json
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+PORT = 26369
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# The message type Cider answers each action with.
+REPLY_TYPES = {
+    'search': 'searchResults',
+    'get-currentmediaitem': 'playbackStateUpdate',
+    'library-status': 'libraryStatus',
+    'rating': 'rate',
+    'change-library': 'change-library',
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Serve Cider WebSocket replies from recorded fixtures')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Milliseconds before every reply')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='Up to this many extra milliseconds, at random')
+    parser.add_argument('--push-interval', type=float, default=0,
+                        help='Seconds between unsolicited playbackStateUpdate frames')
+    parser.add_argument('--push-ratio', type=float, default=0,
+                        help='Share of replies preceded by a playbackStateUpdate frame')
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args()
+
+
+def read_frame(sock: socket.socket):
+    def read(size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('Client went away')
+            data += chunk
+        return data
+    head = read(2)
+    opcode, length = head[0] & 0x0F, head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack('>H', read(2))[0]
+    elif length == 127:
+        length = struct.unpack('>Q', read(8))[0]
+    mask = read(4) if head[1] & 0x80 else b'\0\0\0\0'
+    payload = read(length)
+    # Unmasking a whole word at a time is much faster than per byte.
+    key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+    payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+    return opcode, payload
+
+
+def frame(payload: bytes, opcode: int = OP_TEXT) -> bytes:
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('>BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack('>BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+    return head + payload
+
+
+class MockCider:
+    """Answers Cider actions from fixtures, keeping library and rating
+    changes in memory"""
+
+    def __init__(self, fixtures: Path = FIXTURES, latency: float = 0, jitter: float = 0,
+                 push_interval: float = 0, push_ratio: float = 0,
+                 seed: Optional[int] = None):
+        self.catalog: Dict[str, List[Dict]] = json.loads(
+            (fixtures / 'catalog.json').read_text(encoding='utf-8'))
+        self.playback: Dict = json.loads(
+            (fixtures / 'playback.json').read_text(encoding='utf-8'))
+        self.latency = latency
+        self.jitter = jitter
+        self.push_interval = push_interval
+        self.push_ratio = push_ratio
+        self.random = random.Random(seed)
+        self.library = set()
+        self.ratings: Dict[str, int] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        return (self.latency + self.random.uniform(0, self.jitter)) / 1000
+
+    def should_push(self) -> bool:
+        return self.push_ratio > 0 and self.random.random() < self.push_ratio
+
+    def push(self) -> Dict:
+        return {'status': 0, 'message': '', 'type': 'playbackStateUpdate',
+                'data': self.playback}
+
+    def search(self, term: str, limit: int = 20, types: str = 'songs,albums',
+               offset: int = 0) -> Dict:
+        words = term.lower().split()
+        data: Dict = {}
+        order = []
+        for category in types.split(','):
+            matches = [item for item in self.catalog.get(category, ())
+                       if all(word in ' '.join((
+                           item['attributes']['name'],
+                           item['attributes'].get('artistName', ''),
+                           item['attributes'].get('curatorName', ''))).lower()
+                           for word in words)]
+            page = matches[offset:offset + limit]
+            if not page:
+                # Cider leaves categories without matches out.
+                continue
+            order.append(category)
+            data[category] = {
+                'href': f'/v1/catalog/us/search?{urlencode({"term": term, "types": category})}',
+                'data': copy.deepcopy(page),
+            }
+            if offset + limit < len(matches):
+                data[category]['next'] = '/v1/catalog/us/search?' + urlencode(
+                    {'term': term, 'types': category, 'offset': offset + limit})
+        data['meta'] = {'results': {'order': order, 'rawOrder': order}}
+        return data
+
+    def reply(self, message: Dict) -> Dict:
+        action = message.get('action')
+        with self._lock:
+            self.requests += 1
+            if action == 'search':
+                data = self.search(message.get('term', ''), int(message.get('limit', 20)),
+                                   message.get('types', 'songs,albums'),
+                                   int(message.get('offset', 0)))
+            elif action == 'get-currentmediaitem':
+                data = self.playback
+            elif action in ('play', 'pause'):
+                self.playback = {**self.playback, 'status': action == 'play'}
+                data = {}
+            elif action == 'library-status':
+                id = message.get('id')
+                data = {'inLibrary': id in self.library, 'rating': self.ratings.get(id, 0)}
+            elif action == 'rating':
+                self.ratings[message.get('id')] = message.get('rating', 0)
+                data = {}
+            elif action == 'change-library':
+                if message.get('add'):
+                    self.library.add(message.get('id'))
+                else:
+                    self.library.discard(message.get('id'))
+                data = {}
+            else:
+                data = {}
+        return {'status': 0, 'message': 'ok', 'type': REPLY_TYPES.get(action, 'generic'),
+                'data': data}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: 'MockCiderServer'
+
+    def handshake(self) -> bool:
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        headers = dict(line.split(b':', 1) for line in request.split(b'\r\n')[1:] if b':' in line)
+        key = {name.strip().lower(): value.strip() for name, value in headers.items()}[
+            b'sec-websocket-key']
+        accept = base64.b64encode(hashlib.sha1(key + GUID).digest())
+        self.request.sendall(b'HTTP/1.1 101 Switching Protocols\r\n'
+                             b'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                             b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        return True
+
+    def send(self, message: Dict, opcode: int = OP_TEXT) -> None:
+        payload = message if isinstance(message, bytes) else json.dumps(message).encode()
+        with self.write_lock:
+            self.request.sendall(frame(payload, opcode))
+
+    def pushes(self, stop: threading.Event) -> None:
+        mock = self.server.mock
+        while not stop.wait(mock.push_interval):
+            try:
+                self.send(mock.push())
+            except OSError:
+                return
+
+    def handle(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.write_lock = threading.Lock()
+        if not self.handshake():
+            return
+        mock = self.server.mock
+        stop = threading.Event()
+        if mock.push_interval > 0:
+            threading.Thread(target=self.pushes, args=(stop,), daemon=True).start()
+        try:
+            while True:
+                opcode, payload = read_frame(self.request)
+                if opcode == OP_CLOSE:
+                    self.send(b'', OP_CLOSE)
+                    return
+                if opcode == OP_PING:
+                    self.send(payload, OP_PONG)
+                    continue
+                if opcode != OP_TEXT:
+                    continue
+                reply = mock.reply(json.loads(payload))
+                time.sleep(mock.delay())
+                if mock.should_push():
+                    self.send(mock.push())
+                self.send(reply)
+        except (ConnectionError, OSError):
+            return
+        finally:
+            stop.set()
+
+
+class MockCiderServer(socketserver.ThreadingTCPServer):
+    """Threaded server for a MockCider, port 0 picks a free port"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, mock: MockCider, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.mock = mock
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> 'MockCiderServer':
+        """Serves from a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main(args: argparse.Namespace) -> None:
+    mock = MockCider(args.fixtures, args.latency, args.jitter,
+                     args.push_interval, args.push_ratio, args.seed)
+    with MockCiderServer(mock, args.host, args.port) as server:
+        print(f'Mock Cider listening on ws://{args.host}:{server.port}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main(parse_args())
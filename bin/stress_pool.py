@@ -0,0 +1,159 @@
+"""Hammers one Cider client from many threads against the mock server.
+
+Searches, ratings read back through library-status and batched ratings
+run in parallel through a single Cider, so they share its connection
+pool. Every reply is checked against what the mock holds for that
+request: a reply read by the wrong caller, a lost reply or a timeout
+fails the run. Latency per kind of task, throughput and what the pool
+did are reported.
+"""
+import argparse
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src' / 'plugin'))
+
+from cider_api.cache import SearchCache  # noqa: E402
+from cider_api.cider import Cider  # noqa: E402
+from cider_api.media import Media  # noqa: E402
+from mock_cider import FIXTURES, MockCider, MockCiderServer  # noqa: E402
+
+TERMS = ['radiohead', 'karma police', 'ok computer', 'get lucky', 'daft punk',
+         'fleetwood mac', 'dreams', 'essentials', 'love', 'the']
+TYPES = ('songs', 'albums')
+LIMIT = 10
+BATCH = 5
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Run parallel actions through one Cider client')
+    parser.add_argument('--actions', type=int, default=500,
+                        help='Tasks run, each one to a few actions')
+    parser.add_argument('--workers', type=int, default=64,
+                        help='Threads sharing the client')
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=5,
+                        help='Milliseconds the mock waits before every reply')
+    parser.add_argument('--jitter', type=float, default=5)
+    parser.add_argument('--push-interval', type=float, default=0.05)
+    parser.add_argument('--push-ratio', type=float, default=0.2)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+class Stress:
+    def __init__(self, cider: Cider, mock: MockCider, seed: int):
+        self.cider = cider
+        self.mock = mock
+        self.random = random.Random(seed)
+        self._ids = iter(range(sys.maxsize))
+        self._lock = threading.Lock()
+
+    def unique_id(self) -> str:
+        with self._lock:
+            return f'stress-{next(self._ids)}'
+
+    def search(self) -> Optional[str]:
+        term = self.random.choice(TERMS)
+        results = self.cider.search(term, LIMIT, TYPES)
+        data = self.mock.search(term, LIMIT, ','.join(TYPES))
+        expected = {item['id'] for category in data['meta']['results']['order']
+                    for item in data[category]['data']}
+        found = {media.id for media in results}
+        if found != expected:
+            return f'search {term!r} returned {sorted(found)}, expected {sorted(expected)}'
+        return None
+
+    def rate(self) -> Optional[str]:
+        id = self.unique_id()
+        rating = self.random.choice((-1, 1))
+        self.cider.rate('songs', id, rating)
+        reply = self.cider._action('library-status', type='songs', id=id)
+        if reply['data']['rating'] != rating:
+            return f'{id} rated {rating} reads back as {reply["data"]["rating"]}'
+        return None
+
+    def rate_many(self) -> Optional[str]:
+        medias = [Media(self.unique_id(), 'song', 'Stress', '') for _ in range(BATCH)]
+        rating = self.random.choice(('like', 'dislike'))
+        for result in self.cider.rate_many(medias, rating):
+            if not result.ok:
+                return f'batch rating of {result.media.id} failed: {result.error!r}'
+        for media in medias:
+            reply = self.cider._action('library-status', type='songs', id=media.id)
+            if reply['data']['rating'] != (1 if rating == 'like' else -1):
+                return f'{media.id} {rating}d in a batch reads back as {reply["data"]["rating"]}'
+        return None
+
+    def tasks(self) -> Dict[str, Callable[[], Optional[str]]]:
+        return {'search': self.search, 'rate': self.rate, 'rate_many': self.rate_many}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def main(args: argparse.Namespace) -> int:
+    mock = MockCider(args.fixtures, args.latency, args.jitter,
+                     args.push_interval, args.push_ratio, args.seed)
+    server = MockCiderServer(mock).start()
+    # Searches must reach the server to be checked, not a cache.
+    cider = Cider(port=server.port, search_cache=SearchCache(ttl=0), pool_size=args.pool_size)
+    cider.pages.ttl = 0
+    stress = Stress(cider, mock, args.seed)
+    tasks = stress.tasks()
+    names = [random.Random(args.seed + i).choice(list(tasks)) for i in range(args.actions)]
+
+    def run(name: str) -> Tuple[str, float, Optional[str]]:
+        start = time.perf_counter()
+        try:
+            error = tasks[name]()
+        except Exception as e:
+            error = repr(e)
+        return name, time.perf_counter() - start, error
+
+    timings: Dict[str, List[float]] = {name: [] for name in tasks}
+    errors: List[str] = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.workers) as executor:
+        for future in as_completed([executor.submit(run, name) for name in names]):
+            name, seconds, error = future.result()
+            timings[name].append(seconds)
+            if error is not None:
+                errors.append(f'{name}: {error}')
+    elapsed = time.perf_counter() - start
+    pool = cider._pool
+    opened = pool.stats['opened']
+    cider.close()
+    server.stop()
+
+    for name, samples in timings.items():
+        if samples:
+            print(f'{name:<10}{len(samples):>6} tasks  p50 {percentile(samples, 50) * 1000:7.2f} ms'
+                  f'  p95 {percentile(samples, 95) * 1000:7.2f} ms'
+                  f'  mean {statistics.mean(samples) * 1000:7.2f} ms')
+    print(f'{args.actions} tasks, {mock.requests} actions in {elapsed:.2f} s, '
+          f'{mock.requests / elapsed:.1f} actions/s')
+    print('pool  ' + '  '.join(f'{key} {value}' for key, value in pool.stats.items()))
+    if opened > args.pool_size:
+        errors.append(f'{opened} connections opened, the pool allows {args.pool_size}')
+    for error in errors[:20]:
+        print(error)
+    if errors:
+        print(f'{len(errors)} failures')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
@@ -1,4 +1,10 @@
-from main import FlowCider
+import sys
+
+from host import HOST_ARG, forward, serve
 
 if __name__ == '__main__':
-    FlowCider()
+    if sys.argv[1:] == [HOST_ARG]:
+        serve()
+    elif not forward(sys.argv[1:]):
+        from main import FlowCider
+        FlowCider()
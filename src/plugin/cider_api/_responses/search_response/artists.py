@@ -0,0 +1,17 @@
+from typing import List, TypedDict
+
+from . import artwork
+
+
+class Attributes(TypedDict, total=False):
+    name: str
+    genreNames: List[str]
+    url: str
+    artwork: artwork.Artwork
+
+
+class Artist(TypedDict):
+    id: str
+    type: str
+    href: str
+    attributes: Attributes
@@ -2,6 +2,8 @@ from typing import List, Dict, TypedDict
 
 from . import song
 from . import album
+from . import artists
+from . import playlists
 
 
 class Albums(TypedDict):
@@ -16,11 +18,23 @@ class Songs(TypedDict):
     data: List[song.Song]
 
 
-class Data(TypedDict):
+class Artists(TypedDict):
+    href: str
+    next: str
+    data: List[artists.Artist]
+
+
+class Playlists(TypedDict):
+    href: str
+    next: str
+    data: List[playlists.Playlist]
+
+
+class Data(TypedDict, total=False):
     songs: Songs
     albums: Albums
-    playlists: Dict
-    artists: Dict
+    playlists: Playlists
+    artists: Artists
     meta: Dict
 
 
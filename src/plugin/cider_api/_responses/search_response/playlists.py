@@ -0,0 +1,23 @@
+from typing import Dict, TypedDict
+
+from . import artwork
+from . import play_params
+
+
+class Attributes(TypedDict, total=False):
+    name: str
+    curatorName: str
+    playlistType: str
+    lastModifiedDate: str
+    isChart: bool
+    url: str
+    description: Dict[str, str]
+    artwork: artwork.Artwork
+    playParams: play_params.PlayParams
+
+
+class Playlist(TypedDict):
+    id: str
+    type: str
+    href: str
+    attributes: Attributes
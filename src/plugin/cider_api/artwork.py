@@ -1,2 +1,27 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .artwork_cache import ArtworkCache
+
+_cache: Optional[ArtworkCache] = None
+
+
+def use_cache(cache: Optional[ArtworkCache]) -> None:
+    """Makes get_artwork prefer images already in the given cache"""
+    global _cache
+    _cache = cache
+
+
 def get_artwork(url: str, width: int = 32, height: int = 32) -> str:
-    return url.format(w=width, h=height)
+    url = url.format(w=width, h=height)
+    if _cache is not None:
+        return _cache.get(url) or url
+    return url
+
+
+def preload(urls: Iterable[str], sizes: Sequence[Tuple[int, int]]) -> None:
+    """Looks up the cached artwork of several URLs at once, in every size"""
+    if _cache is not None:
+        _cache.preload(url.format(w=width, h=height)
+                       for url in urls if url for width, height in sizes)
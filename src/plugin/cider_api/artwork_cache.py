@@ -0,0 +1,227 @@
+from __future__ import annotations
+import logging
+import os
+import posixpath
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from .store import PersistentStore
+
+if TYPE_CHECKING:
+    import http.client
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 64 * 1024 * 1024
+# URLs whose lookup is remembered, a long lived plugin forgets them past this.
+MAX_PATHS = 4096
+# Flow only treats files with an image extension as images.
+EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class HTTPPool:
+    """Keep-alive HTTP connections reused across downloads, per host"""
+
+    def __init__(self, timeout: float = 5, max_idle: int = 4):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        import http.client
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout)
+
+    def _checkin(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get(self, url: str) -> bytes:
+        import http.client
+        parts = urlsplit(url)
+        target = parts.path + (f"?{parts.query}" if parts.query else "")
+        # A pooled connection may have been closed by the server since its
+        # last use, so a failure on it is retried once on a fresh one.
+        for attempt in range(2):
+            conn = self._checkout(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", target)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(parts.scheme, parts.netloc, conn)
+            if response.status != 200:
+                raise OSError(f"GET {url} returned {response.status}")
+            return data
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle.clear()
+
+
+class ArtworkCache:
+    """Content addressed disk cache of artwork images.
+
+    Images are stored under the sha256 of their bytes, so the same image
+    reached through different URLs is kept once, and an index maps each
+    URL to its image. Once the images exceed ``max_bytes`` the least
+    recently used ones are removed.
+
+    Lookups are kept in memory, and those of a page of results can be
+    made with one query through :meth:`preload`, so showing an image
+    touches neither the index nor the disk. Images shown are marked as
+    used when the next download runs.
+    """
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES, workers: int = 4,
+                 pool: Optional[HTTPPool] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.pool = pool if pool is not None else HTTPPool(max_idle=workers)
+        os.makedirs(path, exist_ok=True)
+        self._index = PersistentStore(
+            os.path.join(path, "index.sqlite3"), expire=float("inf"))
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        # Path of the image of every URL looked up, None if it isn't cached.
+        self._paths: Dict[str, Optional[str]] = {}
+        # Images shown since uses were last written to their mtime.
+        self._used: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _blobs(self) -> Iterable[os.DirEntry]:
+        try:
+            entries = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return []
+        return [entry for entry in entries if entry.name.endswith(EXTENSIONS)]
+
+    def _remember(self, url: str, stored: Optional[Tuple[str, float]]) -> None:
+        path = None
+        if stored is not None:
+            path = os.path.join(self.path, stored[0])
+            if not os.path.exists(path):
+                # Evicted by another process, which can't tell its URLs.
+                self._index.delete(f"artwork:{url}")
+                path = None
+        if len(self._paths) >= MAX_PATHS:
+            self._paths.clear()
+        self._paths[url] = path
+
+    def preload(self, urls: Iterable[str]) -> None:
+        """Looks up several URLs with one query, for get to answer"""
+        urls = [url for url in dict.fromkeys(urls) if url not in self._paths]
+        if not urls:
+            return
+        stored = self._index.get_many([f"artwork:{url}" for url in urls])
+        for url in urls:
+            self._remember(url, stored.get(f"artwork:{url}"))
+
+    def get(self, url: str) -> Optional[str]:
+        """Path of the cached image for url, if there is one"""
+        if url not in self._paths:
+            self._remember(url, self._index.get(f"artwork:{url}"))
+        path = self._paths.get(url)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.add(path)
+        return path
+
+    def _touch(self) -> None:
+        # The modification time doubles as the last use for eviction.
+        with self._lock:
+            used, self._used = self._used, set()
+        for path in used:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def fetch(self, url: str) -> str:
+        """Downloads url into the cache unless it is already there"""
+        self._touch()
+        path = self.get(url)
+        if path is not None:
+            return path
+        import hashlib
+        data = self.pool.get(url)
+        extension = posixpath.splitext(urlsplit(url).path)[1].lower()
+        if extension not in EXTENSIONS:
+            extension = ".jpg"
+        name = hashlib.sha256(data).hexdigest() + extension
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._grow(len(data))
+        self._index.put(f"artwork:{url}", name)
+        self._paths[url] = path
+        return path
+
+    def fetch_many(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Downloads several images concurrently, mapping failures to None"""
+        def fetch(url: str) -> Optional[str]:
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                logger.debug(f"Could not fetch artwork {url}: {e!r}")
+                return None
+        from concurrent.futures import ThreadPoolExecutor
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="cider-artwork") as executor:
+            return dict(zip(urls, executor.map(fetch, urls)))
+
+    def _grow(self, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(entry.stat().st_size for entry in self._blobs())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Trim to 90% so a full cache doesn't rescan on every download.
+        target = self.max_bytes * 0.9
+        removed = set()
+        for entry in sorted(self._blobs(), key=lambda entry: entry.stat().st_mtime):
+            if self._size <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed.add(entry.path)
+            self._size -= size
+            self.evictions += 1
+        for url, path in list(self._paths.items()):
+            if path in removed:
+                self._paths[url] = None
@@ -0,0 +1,202 @@
+import asyncio
+import functools
+import json
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+import websocket
+from .cider import BASE_HOST, BASE_PORT, RATINGS, RESPONSE_TYPES, TIMEOUT, Cider
+from .decoding import loads
+from .media import SEARCH_TYPES, Media
+from .web_sockets import CONNECT_TIMEOUT, SCHEMA
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCider:
+    """Asyncio counterpart of :class:`Cider`.
+
+    A single reader task hands each incoming frame to the oldest caller
+    awaiting that message type, so several actions can be in flight on
+    one connection at the same time. Replies carry no request id, so an
+    action that times out drops the connection, and every action still
+    waiting on it fails, rather than leave its late reply to the next
+    caller awaiting the same type.
+    """
+
+    def __init__(self, host: str = BASE_HOST, port: int = BASE_PORT):
+        self._host = host
+        self._port = port
+        self._ws = websocket.WebSocket()
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @property
+    def _url(self) -> str:
+        return f"{SCHEMA}://{self._host}:{self._port}"
+
+    async def connect(self) -> None:
+        """Connects to Cider and starts the reader task, unless both are up"""
+        loop = asyncio.get_running_loop()
+        if not self._ws.connected:
+            await loop.run_in_executor(
+                None, functools.partial(self._ws.connect, self._url, timeout=CONNECT_TIMEOUT))
+            # The reader waits for frames indefinitely, deadlines are per action.
+            self._ws.settimeout(None)
+        if self._reader is None or self._reader.done():
+            self._reader = loop.create_task(self._read(self._ws))
+
+    async def close(self) -> None:
+        """Closes the connection and stops the reader task"""
+        reader = self._reader
+        self._abort(ConnectionError("Connection to Cider was closed"))
+        if reader is not None:
+            await asyncio.gather(reader, return_exceptions=True)
+
+    def _abort(self, exception: Exception) -> None:
+        """Drops the connection, failing every action still waiting on it"""
+        self._fail_waiting(exception)
+        # Shutting the socket down wakes its reader blocked in recv(), which
+        # then stops. The next action connects a new socket and reader.
+        self._ws.abort()
+        self._ws = websocket.WebSocket()
+        self._reader = None
+
+    async def _read(self, ws: websocket.WebSocket) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                _, data = await loop.run_in_executor(None, ws.recv_data)
+                self._dispatch(loads(data))
+        except Exception as e:
+            logger.debug(f"Reader stopped: {e!r}")
+            # Replies may have been lost with the frame, start over.
+            ws.shutdown()
+            # Actions on an aborted socket were failed already, those
+            # waiting now are on its replacement.
+            if ws is self._ws:
+                self._fail_waiting(ConnectionError("Connection to Cider was lost"))
+
+    def _dispatch(self, response: Dict) -> None:
+        type = response.get("type") if isinstance(response, dict) else None
+        waiting = self._waiting.get(type)
+        if not waiting:
+            logger.debug(f"Ignoring unsolicited {type} message")
+            return
+        waiting.popleft().set_result(response)
+
+    def _fail_waiting(self, exception: Exception) -> None:
+        for waiting in self._waiting.values():
+            for future in waiting:
+                if not future.done():
+                    future.set_exception(exception)
+        self._waiting.clear()
+
+    async def _action(self, action: str, timeout: float = TIMEOUT, **kwargs) -> Dict:
+        await self.connect()
+        loop = asyncio.get_running_loop()
+        type = RESPONSE_TYPES.get(action, "generic")
+        future = loop.create_future()
+        # Registered before sending, the reply may come back at once.
+        self._waiting.setdefault(type, deque()).append(future)
+        try:
+            await loop.run_in_executor(
+                None, self._ws.send, json.dumps({"action": action, **kwargs}))
+            return await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            # Failed sends may have left part of a frame on the socket, and
+            # replies to cancelled actions would reach the wrong caller.
+            future.cancel()
+            self._abort(ConnectionError(f"Connection to Cider dropped after {action} failed"))
+            if isinstance(e, asyncio.TimeoutError):
+                raise TimeoutError(f"Timed out waiting for {type} response") from None
+            raise
+
+    async def search(self, term: str, limit: int = 20, types: Sequence[str] = SEARCH_TYPES,
+                     artist: Optional[str] = None) -> List[Media]:
+        """Searches like :meth:`Cider.search`, without its caches"""
+        if artist:
+            term = f"{term} {artist}"
+        r = await self._action("search", term=term,
+                               limit=limit, types=",".join(types))
+        results = [Media.from_resource(resource)
+                   for type in types if r["data"].get(type)
+                   for resource in r["data"][type]["data"][:limit]]
+        return Cider._by_artist(results, artist) if artist else results
+
+    async def media_status(self) -> Dict[str, Any]:
+        return await self._action("get-currentmediaitem")
+
+    async def play(self) -> None:
+        """Starts playback"""
+        await self._action("play")
+
+    async def pause(self) -> None:
+        """Pauses playback"""
+        await self._action("pause")
+
+    async def play_pause(self) -> None:
+        """Toggles play/pause"""
+        if (await self.media_status())["data"]["status"]:
+            await self.pause()
+        else:
+            await self.play()
+
+    async def play_media_by_id(self, id: str, kind: str = "song") -> None:
+        await self._action("play-mediaitem", id=id, kind=kind)
+
+    async def play_media(self, media: Media) -> None:
+        """Plays the given media item"""
+        await self.play_media_by_id(media.id, media.kind)
+
+    async def play_media_next(self, media: Media) -> None:
+        """Adds media as next in the queue"""
+        await self._action("play-next", id=media.id, type=media.kind)
+
+    async def play_media_last(self, media: Media) -> None:
+        """Adds media as last in the queue"""
+        await self._action("play-later", id=media.id, type=media.kind)
+
+    async def rate(self, type: str, id: str, rating: int) -> None:
+        """Rate a media item"""
+        valid_ratings = [-1, 0, 1]
+        if rating not in valid_ratings:
+            raise ValueError(f"Rating must be one of {valid_ratings}")
+        await self._action("rating", type=type, id=id, rating=rating)
+
+    async def rate_media(self, media: Media, rating: str) -> None:
+        """Rate a media item"""
+        if rating not in RATINGS:
+            raise ValueError(
+                f"Rating must be one of {list(RATINGS.keys())}")
+        await self.rate(media.kind, media.id, RATINGS[rating])
+
+    async def library_status(self, media: Media) -> Dict:
+        """Checks if a media item is in the library"""
+        return await self._action("library-status", type=media.kind, id=media.id)
+
+    async def _library(self, type: str, id: str, add: bool) -> None:
+        """Adds/removes a media item from the library"""
+        await self._action("change-library", type=type, id=id, add=add)
+
+    async def add_to_library(self, media: Media) -> None:
+        """Adds a media item to the library"""
+        await self._library(media.kind, media.id, True)
+
+    async def remove_from_library(self, media: Media) -> None:
+        """Removes a media item from the library"""
+        await self._library(media.kind, media.id, False)
+
+    async def toggle_library(self, media: Media) -> None:
+        """Toggles a media item in the library"""
+        status = await self.library_status(media)
+        await self._library(media.kind, media.id,
+                            not status["data"]["inLibrary"])
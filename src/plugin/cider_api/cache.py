@@ -0,0 +1,238 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .media import SEARCH_TYPES, Media
+from .store import PersistentStore
+
+
+def normalize(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def matches(media: Media, term: str) -> bool:
+    """True if every word of the term appears in the media's name or artist"""
+    haystack = f"{media.name} {media.artist_name}".lower()
+    return all(token in haystack for token in term.split())
+
+
+_Key = Tuple[str, int, Tuple[str, ...]]
+_PageKey = Tuple[str, int, Tuple[str, ...], int]
+
+
+@dataclass
+class SearchPage:
+    """One page of search results"""
+    results: List[Media]
+    offset: int
+    # Categories Cider gave a next cursor for, which have another page.
+    next: Tuple[str, ...] = ()
+
+    @property
+    def more(self) -> bool:
+        return bool(self.next)
+
+
+@dataclass
+class _Entry:
+    results: List[Media]
+    truncated: bool
+    expires: float
+
+
+class SearchCache:
+    """LRU cache of search results with a time to live.
+
+    Entries are keyed on the normalized term, the limit and the searched
+    categories, and the cache is bounded both by entry count and by the
+    total number of cached results. A result set that was not truncated
+    at its limit holds every match for its term, so it can also answer
+    any longer query that starts with that term by filtering locally. It
+    may be shared by threads searching at once.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 128, max_results: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self._entries: "OrderedDict[_Key, _Entry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fresh(self, key: _Key, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: _Key) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.results)
+
+    def get(self, term: str, limit: int,
+            types: Tuple[str, ...] = SEARCH_TYPES) -> Optional[List[Media]]:
+        with self._lock:
+            term = normalize(term)
+            now = time.time()
+            entry = self._fresh((term, limit, types), now)
+            if entry is not None:
+                self._entries.move_to_end((term, limit, types))
+                self.hits += 1
+                return list(entry.results)
+            # Longest complete result set for a prefix of this term.
+            best = None
+            for key in list(self._entries):
+                cached_term, cached_limit, cached_types = key
+                if cached_types != types or cached_limit < limit \
+                        or not term.startswith(cached_term):
+                    continue
+                entry = self._fresh(key, now)
+                if entry is None or entry.truncated:
+                    continue
+                if best is None or len(cached_term) > len(best[0]):
+                    best = (cached_term, key, entry)
+            if best is None:
+                self.misses += 1
+                return None
+            cached_term, key, entry = best
+            self._entries.move_to_end(key)
+            self.prefix_hits += 1
+            counts: Dict[str, int] = {}
+            results = []
+            for media in entry.results:
+                if counts.get(media.kind, 0) >= limit:
+                    continue
+                if cached_term == term or matches(media, term):
+                    counts[media.kind] = counts.get(media.kind, 0) + 1
+                    results.append(media)
+            return results
+
+    def put(self, term: str, limit: int, results: List[Media], truncated: bool = True,
+            types: Tuple[str, ...] = SEARCH_TYPES) -> None:
+        with self._lock:
+            key = (normalize(term), limit, types)
+            if key in self._entries:
+                self._remove(key)
+            if self.ttl <= 0 or len(results) > self.max_results:
+                return
+            self._entries[key] = _Entry(
+                list(results), truncated, time.time() + self.ttl)
+            self._size += len(results)
+            while len(self._entries) > self.max_entries or self._size > self.max_results:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "results": self._size,
+                "hits": self.hits,
+                "prefix_hits": self.prefix_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class PageCache:
+    """LRU cache of search pages with a time to live.
+
+    Pages are keyed on the normalized term, the limit, the searched
+    categories and their offset, so paging back to a page already seen
+    costs no round trip.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[_PageKey, Tuple[SearchPage, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, term: str, limit: int, types: Tuple[str, ...],
+            offset: int) -> Optional[SearchPage]:
+        with self._lock:
+            key = (normalize(term), limit, types, offset)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, term: str, limit: int, types: Tuple[str, ...], page: SearchPage) -> None:
+        with self._lock:
+            key = (normalize(term), limit, types, page.offset)
+            self._entries.pop(key, None)
+            if self.ttl <= 0:
+                return
+            self._entries[key] = (page, time.time() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class LibraryStatusCache:
+    """Short lived cache of libraryStatus replies keyed on (kind, id).
+
+    Changes we make are applied optimistically, so a context menu opened
+    right after rating or adding an item needs no round trip. With a
+    store, statuses are shared between plugin processes.
+    """
+
+    def __init__(self, ttl: float = 60, store: Optional[PersistentStore] = None):
+        self.ttl = ttl
+        self.store = store
+        self._entries: Dict[Tuple[str, str], Tuple[Dict, float]] = {}
+
+    @staticmethod
+    def _store_key(key: Tuple[str, str]) -> str:
+        return f"library-status:{key[0]}:{key[1]}"
+
+    def get(self, media: Media) -> Optional[Dict]:
+        key = (media.kind, media.id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] >= time.time():
+            return entry[0]
+        if self.store is not None:
+            stored = self.store.get(self._store_key(key))
+            if stored is not None and stored[1] <= self.ttl:
+                self._entries[key] = (stored[0], time.time() + self.ttl - stored[1])
+                return stored[0]
+        return None
+
+    def put(self, media: Media, response: Dict) -> None:
+        key = (media.kind, media.id)
+        self._entries[key] = (response, time.time() + self.ttl)
+        if self.store is not None:
+            self.store.put(self._store_key(key), response)
+
+    def update(self, media: Media, **changes) -> None:
+        """Applies a change we made to a cached status"""
+        response = self.get(media)
+        if response is not None:
+            self.put(media, {**response, "data": {**response["data"], **changes}})
+
+    def invalidate(self, media: Media) -> None:
+        key = (media.kind, media.id)
+        self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self._store_key(key))
@@ -1,60 +1,392 @@
-import json
+from __future__ import annotations
+import logging
+import threading
 import time
-from tracemalloc import start
-import webbrowser
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
 
-import websocket
-from .media import Media
+from . import tracing
+from .cache import LibraryStatusCache, PageCache, SearchCache, SearchPage, normalize
+from .library_index import LibraryIndex
+from .media import KINDS, SEARCH_TYPES, Media
+from .store import PersistentStore
+
+if TYPE_CHECKING:
+    # websocket and ssl are only imported once Cider is first contacted,
+    # queries answered from the stores never pay for them.
+    from .playback import PlaybackListener
+    from .web_sockets import ConnectionPool
+
+logger = logging.getLogger(__name__)
 
 
 BASE_HOST = "127.0.0.1"
 BASE_PORT = 26369
+NOW_PLAYING_KEY = "now-playing"
+RATINGS = {"dislike": -1, "unrate": 0, "like": 1}
+# The message type Cider answers each action with. Other actions are
+# answered with a generic message.
+RESPONSE_TYPES = {
+    "search": "searchResults",
+    "get-currentmediaitem": "playbackStateUpdate",
+    "library-status": "libraryStatus",
+    "rating": "rate",
+    "change-library": "change-library",
+}
+# Seconds an action may take before it is given up on.
+TIMEOUT = 5
+
+
+@dataclass
+class ActionResult:
+    """Outcome of one item of a batch action"""
+    media: Media
+    response: Optional[Dict] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 
 class Cider:
 
-    def __init__(self, host: str = BASE_HOST, port: int = BASE_PORT):
+    def __init__(self, host: str = BASE_HOST, port: int = BASE_PORT,
+                 search_cache: Optional[SearchCache] = None,
+                 store: Optional[PersistentStore] = None,
+                 library: Optional[LibraryIndex] = None, pool_size: Optional[int] = None):
         self._host = host
         self._port = port
-        self._ws = websocket.WebSocket()
+        self._pool_size = pool_size
+        self._connections: Optional[ConnectionPool] = None
+        self._connect_lock = threading.Lock()
+        self.search_cache = search_cache if search_cache is not None else SearchCache()
+        self.pages = PageCache()
+        self.store = store
+        self.library = library if library is not None else LibraryIndex()
+        self.library_statuses = LibraryStatusCache(store=store)
+        self.playback: Optional[PlaybackListener] = None
+
+    @property
+    def _pool(self) -> ConnectionPool:
+        pool = self._connections
+        if pool is None:
+            with self._connect_lock:
+                pool = self._connections
+                if pool is None:
+                    from .web_sockets import POOL_SIZE, ConnectionPool
+                    pool = self._connections = ConnectionPool(
+                        self._host, self._port, self._pool_size or POOL_SIZE)
+        return pool
 
-    def _action(self, action: str, status: str = "generic", timeout: int = 30, **kwargs) -> Dict:
-        self._ws.connect(f"ws://{self._host}:{self._port}")
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _action(self, action: str, timeout: float = TIMEOUT, **kwargs) -> Dict:
         message = {"action": action, **kwargs}
-        self._ws.send(json.dumps(message))
-        start = time.time()
-        while True:
-            response = json.loads(self._ws.recv())
-            if response["type"] == status:
-                break
-            if time.time() - start > timeout:
-                raise TimeoutError("Timed out waiting for response")
-        self._ws.close()
-        return response
+        deadline = time.monotonic() + timeout
+        # Waiting for a free connection counts towards the action's timeout.
+        with tracing.span(f"cider.{action}"), self._pool.connection(timeout) as ws:
+            return ws.send(message, RESPONSE_TYPES.get(action, "generic"),
+                           deadline - time.monotonic())
+
+    def _batch(self, action: str, items: Iterable[Tuple[Media, Dict]],
+               timeout: float = TIMEOUT) -> List[ActionResult]:
+        """Sends one action per item over the same connection before
+        waiting for any reply, then collects the replies in order."""
+        pool = self._pool
+        # Like a single action, the whole batch shares one timeout.
+        deadline = time.monotonic() + timeout
+        try:
+            ws = pool.checkout(timeout)
+        except Exception as e:
+            return [ActionResult(media, error=e) for media, _ in items]
+        results = []
+        try:
+            pending = []
+            error = None
+            for media, kwargs in items:
+                result = ActionResult(media, error=error)
+                results.append(result)
+                if error is not None:
+                    continue
+                try:
+                    pending.append((result, ws.submit(
+                        {"action": action, **kwargs},
+                        RESPONSE_TYPES.get(action, "generic"))))
+                except Exception as e:
+                    # The rest would fail the same way without a connection.
+                    result.error = error = e
+            for i, (result, request) in enumerate(pending):
+                try:
+                    result.response = ws.result(request, deadline - time.monotonic())
+                except Exception as e:
+                    # A failed read drops the connection and every reply
+                    # still outstanding on it.
+                    for result, _ in pending[i:]:
+                        result.error = e
+                    break
+        finally:
+            pool.checkin(ws)
+        return results
+
+    def _refresh(self, method: Callable, *args) -> None:
+        """Runs method in the background to refresh stored data"""
+        def target():
+            try:
+                method(*args)
+            except Exception as e:
+                logger.warning(f"Background refresh failed: {e!r}")
+        threading.Thread(target=target).start()
+
+    def close(self) -> None:
+        """Closes the connections to Cider, later actions open new ones"""
+        if self.playback is not None:
+            self.playback.stop()
+        with self._connect_lock:
+            pool, self._connections = self._connections, None
+        if pool is not None:
+            pool.close()
+
+    def subscribe(self) -> PlaybackListener:
+        """Keeps the playback state current from Cider's pushes"""
+        if self.playback is None:
+            from .playback import PlaybackListener
+            self.playback = PlaybackListener(
+                self._host, self._port, on_push=self._playback_pushed)
+        self.playback.start()
+        return self.playback
+
+    def _playback_pushed(self, response: Dict) -> None:
+        # The playing item may have been rated or added in Cider itself.
+        try:
+            media = Media.from_attributes(response["data"])
+        except (KeyError, TypeError):
+            return
+        self.library_statuses.invalidate(media)
 
     def open(self) -> None:
         """Opens the Cider application"""
+        import webbrowser
         webbrowser.open("cider://start")
 
-    def search(self, term: str, limit: int = 20) -> List[Media]:
-        r = self._action("search", "searchResults", term=term, limit=limit)
-        media_items = []
-        if r["data"].get("songs") and r["data"].get("albums"):
-            media_items = r["data"]["songs"]["data"] + \
-                r["data"]["albums"]["data"]
-        return [Media(media_item["attributes"]) for media_item in media_items]
+    def search(self, term: str, limit: int = 20, types: Sequence[str] = SEARCH_TYPES,
+               artist: Optional[str] = None) -> List[Media]:
+        """Searches the catalog for up to limit items of each of types.
+
+        Only the given categories are requested. Cider has no artist
+        filter, so the artist is added to the searched words, which is
+        enough for the catalog to rank that artist's items first, and the
+        results are then narrowed to it.
+        """
+        types = tuple(types)
+        if artist:
+            term = f"{term} {artist}"
+        results = self._cached_search(term, limit, types)
+        if artist:
+            results = self._by_artist(results, artist)
+        return results
+
+    def search_page(self, term: str, limit: int = 20, types: Sequence[str] = SEARCH_TYPES,
+                    page: int = 0, artist: Optional[str] = None) -> SearchPage:
+        """Searches like :meth:`search`, for the page-th page of results.
+
+        The first page is the one :meth:`search` returns. Later pages
+        continue only the categories the page before had a next cursor
+        for, and are cached like the first. A page holding only items of
+        the page before, as when Cider ignores the offset, ends the
+        results. The catalog ranks the artist's items first, so once a
+        page has none of them it is the last too.
+        """
+        types = tuple(types)
+        if artist:
+            term = f"{term} {artist}"
+        offset = page * limit
+        result = self.pages.get(term, limit, types, offset)
+        if result is None and page == 0:
+            results = self._cached_search(term, limit, types)
+            # Set aside by _search, unless answered from the search cache.
+            result = self.pages.get(term, limit, types, 0) or SearchPage(
+                results, 0, self._full(results, limit, types))
+        elif result is None:
+            result = self._stored_page(term, limit, types, offset)
+        previous = None
+        if page:
+            previous = self.pages.get(term, limit, types, offset - limit) \
+                or self._stored_page(term, limit, types, offset - limit)
+        if result is None:
+            remaining = previous.next if previous is not None else types
+            result = self._search(term, limit, types, offset, remaining) \
+                if remaining else SearchPage([], offset)
+        if previous is not None and result.results and {
+                media.id for media in result.results} <= {media.id for media in previous.results}:
+            result = SearchPage([], offset)
+        if artist:
+            results = self._by_artist(result.results, artist)
+            result = SearchPage(results, offset, result.next if results else ())
+        return result
+
+    def search_pages(self, term: str, limit: int = 20, types: Sequence[str] = SEARCH_TYPES,
+                     artist: Optional[str] = None) -> Iterator[SearchPage]:
+        """Pages of results, each fetched only once the one before was used"""
+        page = 0
+        while True:
+            result = self.search_page(term, limit, types, page, artist)
+            yield result
+            if not result.more:
+                return
+            page += 1
+
+    @staticmethod
+    def _by_artist(results: List[Media], artist: str) -> List[Media]:
+        # Quotes are left out of artists picked from results.
+        artist = artist.lower()
+        return [media for media in results if artist in (
+            media.name if media.kind == "artist" else media.artist_name
+        ).lower().replace('"', "")]
 
-    def media_status(self) -> Dict[str, Any]:
-        return self._action("get-currentmediaitem", "playbackStateUpdate")
+    @staticmethod
+    def _full(results: List[Media], limit: int, types: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Categories with a full page, which likely have another"""
+        counts: Dict[str, int] = {}
+        for media in results:
+            counts[media.kind] = counts.get(media.kind, 0) + 1
+        return tuple(type for type in types if counts.get(KINDS[type], 0) >= limit)
+
+    def _stored_page(self, term: str, limit: int, types: Tuple[str, ...],
+                     offset: int) -> Optional[SearchPage]:
+        if self.store is None:
+            return None
+        stored = self.store.get(self._search_key(term, limit, types, offset))
+        if stored is None or stored[1] > self.pages.ttl:
+            return None
+        value = stored[0]
+        if "next" not in value:
+            # Stored before pages were, which categories continue is unknown.
+            return None
+        result = SearchPage([Media.from_attributes(attributes) for attributes in value["results"]],
+                            offset, tuple(value["next"]))
+        self.pages.put(term, limit, types, result)
+        return result
+
+    def _cached_search(self, term: str, limit: int, types: Tuple[str, ...]) -> List[Media]:
+        cached = self.search_cache.get(term, limit, types)
+        if cached is not None:
+            return cached
+        if self.store is not None:
+            stored = self.store.get(self._search_key(term, limit, types))
+            if stored is not None:
+                value, age = stored
+                results = [Media.from_attributes(attributes)
+                           for attributes in value["results"]]
+                self.search_cache.put(term, limit, results, value["truncated"], types)
+                if "next" in value:
+                    self.pages.put(term, limit, types, SearchPage(results, 0, tuple(value["next"])))
+                if age > self.search_cache.ttl:
+                    self._refresh(self._search, term, limit, types)
+                return results
+        return self._search(term, limit, types).results
+
+    @staticmethod
+    def _search_key(term: str, limit: int, types: Tuple[str, ...], offset: int = 0) -> str:
+        key = f"search:{','.join(types)}:{normalize(term)}:{limit}"
+        return f"{key}:{offset}" if offset else key
+
+    def _search(self, term: str, limit: int, types: Tuple[str, ...] = SEARCH_TYPES,
+                offset: int = 0, requested: Optional[Tuple[str, ...]] = None) -> SearchPage:
+        """Fetches one page of up to limit items of each of the requested
+        categories, by default all of types, which the page is cached under"""
+        if requested is None:
+            requested = types
+        if offset:
+            r = self._action("search", term=term, limit=limit,
+                             types=",".join(requested), offset=offset)
+        else:
+            r = self._action("search", term=term, limit=limit, types=",".join(requested))
+        results = []
+        truncated = False
+        continued = []
+        # A category with no matches is left out of the reply.
+        for type in requested:
+            category = r["data"].get(type)
+            if not category:
+                continue
+            results += [Media.from_resource(resource)
+                        for resource in category["data"][:limit]]
+            if category.get("next"):
+                continued.append(type)
+            truncated |= bool(category.get("next")) or \
+                len(category["data"]) >= limit
+        page = SearchPage(results, offset, tuple(continued))
+        self.pages.put(term, limit, types, page)
+        if not offset:
+            self.search_cache.put(term, limit, results, truncated, types)
+        if self.store is not None:
+            self.store.put(self._search_key(term, limit, types, offset), {
+                "results": [media.to_attributes() for media in results],
+                "truncated": truncated,
+                "next": page.next,
+            })
+        return page
+
+    def media_status(self, max_stale: float = 0) -> Dict[str, Any]:
+        """Returns the current media item.
+
+        While subscribed, a fresh pushed snapshot is returned without any
+        round trip. With max_stale set, a stored status up to that many
+        seconds old is returned right away while a fresh one is fetched in
+        the background.
+        """
+        if self.playback is not None:
+            snapshot = self.playback.get()
+            if snapshot is not None:
+                return snapshot
+        if max_stale and self.store is not None:
+            stored = self.store.get(NOW_PLAYING_KEY)
+            if stored is not None and stored[1] <= max_stale:
+                self._refresh(self._media_status)
+                return stored[0]
+        return self._media_status()
+
+    def _media_status(self) -> Dict[str, Any]:
+        r = self._action("get-currentmediaitem")
+        self.record_media_status(r)
+        return r
+
+    def record_media_status(self, response: Dict) -> None:
+        """Remembers a media status reply, however it was fetched"""
+        if self.playback is not None:
+            self.playback.update(response)
+        if self.store is not None:
+            self.store.put(NOW_PLAYING_KEY, response)
+
+    def _forget_media_status(self) -> None:
+        if self.playback is not None:
+            self.playback.invalidate()
+        if self.store is not None:
+            self.store.delete(NOW_PLAYING_KEY)
 
     def play(self) -> None:
         """Starts playback"""
         self._action("play")
+        self._forget_media_status()
 
     def pause(self) -> None:
         """Pauses playback"""
         self._action("pause")
+        self._forget_media_status()
 
     def play_pause(self) -> None:
         """Toggles play/pause"""
@@ -65,10 +397,11 @@ class Cider:
 
     def play_media_by_id(self, id: str, kind: str = "song") -> None:
         self._action("play-mediaitem", id=id, kind=kind)
+        self._forget_media_status()
 
     def play_media(self, media: Media) -> None:
         """Plays the given media item"""
-        self.play_media_by_id(media.id, media.play_params["kind"])
+        self.play_media_by_id(media.id, media.kind)
 
     def play_media_next(self, media: Media) -> None:
         """Adds media as next in the queue"""
@@ -78,44 +411,111 @@ class Cider:
         """Adds media as last in the queue"""
         self._action("play-later", id=media.id, type=media.kind)
 
+    def play_next_many(self, medias: List[Media]) -> List[ActionResult]:
+        """Adds media to the front of the queue, keeping their order"""
+        # Each item goes in front of the previous one, so queue them last first.
+        results = self._batch("play-next", [
+            (media, {"id": media.id, "type": media.kind}) for media in reversed(medias)])
+        return results[::-1]
+
+    def play_later_many(self, medias: List[Media]) -> List[ActionResult]:
+        """Adds media to the end of the queue"""
+        return self._batch("play-later", [
+            (media, {"id": media.id, "type": media.kind}) for media in medias])
+
     def rate(self, type: str, id: str, rating: int) -> None:
         """Rate a media item"""
         valid_ratings = [-1, 0, 1]
         if rating not in valid_ratings:
             raise ValueError(f"Rating must be one of {valid_ratings}")
-        self._action("rating", "rate", type=type, id=id, rating=rating)
+        self._action("rating", type=type, id=id, rating=rating)
 
     def rate_media(self, media: Media, rating: str) -> None:
         """Rate a media item"""
-        rating_map = {"dislike": -1, "unrate": 0, "like": 1}
-        if rating not in rating_map:
+        if rating not in RATINGS:
             raise ValueError(
-                f"Rating must be one of {list(rating_map.keys())}")
-        self.rate(media.play_params["kind"], media.id, rating_map[rating])
+                f"Rating must be one of {list(RATINGS.keys())}")
+        self._change_status(media, lambda: self.rate(
+            media.kind, media.id, RATINGS[rating]), rating=RATINGS[rating])
+
+    def rate_many(self, medias: List[Media], rating: str) -> List[ActionResult]:
+        """Rates several media items"""
+        if rating not in RATINGS:
+            raise ValueError(
+                f"Rating must be one of {list(RATINGS.keys())}")
+        for media in medias:
+            self.library_statuses.update(media, rating=RATINGS[rating])
+        results = self._batch("rating", [
+            (media, {"type": media.kind, "id": media.id, "rating": RATINGS[rating]})
+            for media in medias])
+        for result in results:
+            if not result.ok:
+                self.library_statuses.invalidate(result.media)
+        return results
 
     def library_status(self, media: Media) -> Dict:
         """Checks if a media item is in the library"""
-        r = self._action("library-status", "libraryStatus",
-                         type=media.play_params["kind"], id=media.id)
+        r = self.library_statuses.get(media)
+        if r is None:
+            r = self._action("library-status", type=media.kind, id=media.id)
+            self.record_library_status(media, r)
         return r
 
+    def record_library_status(self, media: Media, response: Dict) -> None:
+        """Remembers a libraryStatus reply, however it was fetched"""
+        self.library_statuses.put(media, response)
+        self._track_library(media, response["data"]["inLibrary"])
+
+    def _track_library(self, media: Media, in_library: bool) -> None:
+        if in_library:
+            self.library.add(media)
+        else:
+            self.library.remove(media.id)
+
+    def _change_status(self, media: Media, action: Callable[[], None], **changes) -> None:
+        """Applies changes to the cached status before the action is
+        confirmed, dropping the cached status if the action fails."""
+        self.library_statuses.update(media, **changes)
+        try:
+            action()
+        except Exception:
+            self.library_statuses.invalidate(media)
+            raise
+
     def _library(self, type: str, id: str, add: bool) -> None:
         """Adds/removes a media item from the library"""
-        self._action("change-library", "change-library",
-                     type=type, id=id, add=add)
+        self._action("change-library", type=type, id=id, add=add)
+
+    def _set_library(self, media: Media, in_library: bool) -> None:
+        self._change_status(media, lambda: self._library(
+            media.kind, media.id, in_library), inLibrary=in_library)
+        self._track_library(media, in_library)
 
     def add_to_library(self, media: Media) -> None:
         """Adds a media item to the library"""
-        self._library(media.play_params["kind"], media.id, True)
+        self._set_library(media, True)
+
+    def add_to_library_many(self, medias: List[Media]) -> List[ActionResult]:
+        """Adds several media items to the library"""
+        for media in medias:
+            self.library_statuses.update(media, inLibrary=True)
+        results = self._batch("change-library", [
+            (media, {"type": media.kind, "id": media.id, "add": True}) for media in medias])
+        for result in results:
+            if result.ok:
+                self._track_library(result.media, True)
+            else:
+                self.library_statuses.invalidate(result.media)
+        return results
 
     def remove_from_library(self, media: Media) -> None:
         """Removes a media item from the library"""
-        self._library(media.play_params["kind"], media.id, False)
+        self._set_library(media, False)
 
     def toggle_library(self, media: Media) -> None:
         """Toggles a media item in the library"""
-        self._library(media.play_params["kind"], media.id, not self.library_status(
-            media)["data"]["inLibrary"])
+        self._set_library(
+            media, not self.library_status(media)["data"]["inLibrary"])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,39 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(fd: int) -> None:
+        # Retries for 10 seconds before raising OSError.
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock(fd: int) -> None:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """Holds an exclusive lock on path, shared with other processes.
+
+    The lock file is created if needed and left in place, removing it
+    would let two processes lock different files of the same name.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        _lock(fd)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,184 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .cache import matches, normalize
+from .file_lock import locked
+from .media import Media
+
+logger = logging.getLogger(__name__)
+
+# How much each kind of use counts towards an item's frecency.
+EVENTS = {
+    "play": 1.0,
+    "next": 0.7,
+    "later": 0.5,
+    "like": 0.8,
+    "unrate": 0.0,
+    "dislike": -1.0,
+}
+# Time for the weight of a use to halve.
+HALF_LIFE = 14 * 24 * 60 * 60
+# Items whose frecency decayed below this are dropped when compacting.
+MIN_SCORE = 0.01
+# The log is compacted once it has this many lines per item, plus a margin.
+COMPACT_RATIO = 4
+COMPACT_MARGIN = 256
+
+
+@dataclass
+class _Item:
+    media: Media
+    score: float
+    # When score was last brought up to date, and the item last played.
+    updated: float
+    played: float = 0.0
+
+
+class PlayHistory:
+    """Frecency of the media the user played, queued and rated.
+
+    Uses are appended to a JSON lines log, so recording one costs a single
+    small write and concurrent plugin processes don't overwrite each
+    other. The log is read once, on first use, and rewritten with one line
+    per item once it grows too long for the items it describes, checked
+    on loading and after each record. Appends and rewrites hold a lock
+    file, so a rewrite keeps the uses other processes recorded since this
+    one read the log.
+    """
+
+    def __init__(self, path: str, half_life: float = HALF_LIFE):
+        self.path = path
+        self.half_life = half_life
+        self._items: Optional[Dict[str, _Item]] = None
+        self._lines = 0
+        self._lock = threading.Lock()
+        self._file_lock = f"{path}.lock"
+
+    def _decay(self, item: _Item, now: float) -> float:
+        return item.score * math.exp(math.log(2) * (item.updated - now) / self.half_life)
+
+    def _apply(self, items: Dict[str, _Item], entry: Dict) -> None:
+        media = Media.from_payload(entry["media"])
+        at = entry["time"]
+        weight = entry.get("score", EVENTS.get(entry["event"], 0.0))
+        item = items.get(media.id)
+        if item is None:
+            item = items[media.id] = _Item(media, 0.0, at)
+        item.media = media
+        item.score = self._decay(item, at) + weight
+        item.updated = at
+        if entry["event"] == "play" or entry.get("played"):
+            item.played = max(item.played, entry.get("played", at))
+
+    def _read(self) -> Tuple[Dict[str, _Item], int]:
+        items: Dict[str, _Item] = {}
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._apply(items, json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by a crash is skipped.
+                        continue
+                    lines += 1
+        except FileNotFoundError:
+            pass
+        return items, lines
+
+    def _load(self) -> Dict[str, _Item]:
+        if self._items is not None:
+            return self._items
+        try:
+            self._items, self._lines = self._read()
+        except OSError as e:
+            logger.warning(f"Could not read play history {self.path}: {e}")
+            self._items, self._lines = {}, 0
+        self._compact_if_long()
+        return self._items
+
+    def _compact_if_long(self) -> None:
+        if self._lines > COMPACT_RATIO * len(self._items) + COMPACT_MARGIN:
+            self._compact()
+
+    def _append(self, entries: List[Dict]) -> None:
+        try:
+            # One write per call keeps lines from concurrent processes whole.
+            with locked(self._file_lock), open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(entry, separators=(",", ":")) + "\n"
+                                for entry in entries))
+            self._lines += len(entries)
+        except OSError as e:
+            logger.warning(f"Could not write play history {self.path}: {e}")
+
+    def _compact(self) -> None:
+        """Rewrites the log with one line per item still worth keeping"""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with locked(self._file_lock):
+                # Read again, other processes may have appended since.
+                items, _ = self._read()
+                now = time.time()
+                kept = {}
+                for id, item in items.items():
+                    score = self._decay(item, now)
+                    if score >= MIN_SCORE or item.played:
+                        kept[id] = _Item(item.media, score, now, item.played)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for item in kept.values():
+                        f.write(json.dumps({
+                            "time": now, "event": "snapshot", "score": item.score,
+                            "played": item.played, "media": item.media.to_payload(),
+                        }, separators=(",", ":")) + "\n")
+                os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not compact play history {self.path}: {e}")
+            return
+        self._items, self._lines = kept, len(kept)
+
+    def record(self, media: Media, event: str) -> None:
+        """Records one use of media, one of :data:`EVENTS`"""
+        self.record_many([media], event)
+
+    def record_many(self, medias: Sequence[Media], event: str) -> None:
+        if event not in EVENTS:
+            raise ValueError(f"Event must be one of {list(EVENTS)}")
+        now = time.time()
+        entries = [{"time": now, "event": event, "media": media.to_payload()}
+                   for media in medias]
+        with self._lock:
+            items = self._load()
+            for entry in entries:
+                self._apply(items, entry)
+            self._append(entries)
+            # A resident host may never load the log again.
+            self._compact_if_long()
+
+    def score(self, media: Media) -> float:
+        """Current frecency of media, 0 if it was never used"""
+        with self._lock:
+            item = self._load().get(media.id)
+            return self._decay(item, time.time()) if item is not None else 0.0
+
+    def last_played(self, media: Media) -> Optional[float]:
+        with self._lock:
+            item = self._load().get(media.id)
+        if item is None or not item.played:
+            return None
+        return item.played
+
+    def top(self, limit: int = 10, term: str = "") -> List[Media]:
+        """Most frecent items, optionally only those matching term"""
+        term = normalize(term)
+        now = time.time()
+        with self._lock:
+            scored = [(self._decay(item, now), item.media) for item in self._load().values()
+                      if not term or matches(item.media, term)]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [media for score, media in scored[:limit] if score > 0]
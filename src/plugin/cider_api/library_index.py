@@ -0,0 +1,194 @@
+import bisect
+import heapq
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .media import Media
+from .store import PersistentStore
+
+KEY_PREFIX = "library:"
+# Fields kept for every item: kind, name, artistName, albumName, genreNames, artwork url.
+Document = Tuple[str, str, str, str, Tuple[str, ...], str]
+
+# Below this many candidates, items are checked directly instead of expanding prefixes.
+CANDIDATE_SCAN = 256
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = edits = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            edits += 1
+            if edits > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+            continue
+        i += 1
+        j += 1
+    return edits + (len(b) - j) <= 1
+
+
+class LibraryIndex:
+    """Inverted index over media known to be in the user's library.
+
+    Cider offers no way to list the library, so items are added as Cider
+    confirms them to be in it and removed when they leave. Query words
+    match whole tokens, token prefixes and, for longer words, tokens one
+    edit away. Items are persisted one per key so updates stay small.
+    """
+
+    def __init__(self, store: Optional[PersistentStore] = None):
+        self.store = store
+        self._docs: Dict[str, Document] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._loaded = store is None
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._docs)
+
+    def __contains__(self, id: str) -> bool:
+        self._load()
+        return id in self._docs
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        for key, doc in self.store.items(KEY_PREFIX):
+            self._index(key[len(KEY_PREFIX):], tuple(doc[:4]) + (tuple(doc[4]), doc[5]))
+
+    def _index(self, id: str, doc: Document) -> None:
+        self._docs[id] = doc
+        self._doc_tokens[id] = tokens = self._tokens(doc)
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                bisect.insort(self._vocab, token)
+            postings.add(id)
+
+    @staticmethod
+    def _tokens(doc: Document) -> Set[str]:
+        _, name, artist_name, album_name, genres, _ = doc
+        return set(tokenize(" ".join((name, artist_name, album_name) + genres)))
+
+    def add(self, media: Media) -> None:
+        """Adds or updates an item"""
+        self._load()
+        doc: Document = (
+            media.kind,
+            media.name,
+            media.artist_name,
+            media.album_name,
+            media.genre_names,
+            media.artwork_url,
+        )
+        if self._docs.get(media.id) == doc:
+            return
+        self._unindex(media.id)
+        self._index(media.id, doc)
+        if self.store is not None:
+            self.store.put(KEY_PREFIX + media.id, doc)
+
+    def _unindex(self, id: str) -> None:
+        if self._docs.pop(id, None) is None:
+            return
+        for token in self._doc_tokens.pop(id):
+            postings = self._postings[token]
+            postings.discard(id)
+            if not postings:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+
+    def remove(self, id: str) -> None:
+        """Removes an item"""
+        self._load()
+        if id in self._docs:
+            self._unindex(id)
+            if self.store is not None:
+                self.store.delete(KEY_PREFIX + id)
+
+    @staticmethod
+    def _score(query_token: str, token: str) -> int:
+        if token == query_token:
+            return 3
+        if token.startswith(query_token):
+            return 2
+        return int(len(query_token) >= 4 and _within_one_edit(query_token, token))
+
+    def _matches(self, token: str) -> Dict[str, int]:
+        """Ids matching a query token, scored 3 exact, 2 prefix, 1 fuzzy"""
+        scores: Dict[str, int] = {}
+        start = bisect.bisect_left(self._vocab, token)
+        for candidate in self._vocab[start:]:
+            if not candidate.startswith(token):
+                break
+            score = 3 if candidate == token else 2
+            for id in self._postings[candidate]:
+                scores[id] = max(scores.get(id, 0), score)
+        if not scores and len(token) >= 4:
+            for candidate in self._vocab:
+                if _within_one_edit(token, candidate):
+                    for id in self._postings[candidate]:
+                        scores[id] = 1
+        return scores
+
+    def search(self, term: str, limit: int = 20) -> List[Media]:
+        """Returns up to limit items of each kind matching every word of term"""
+        self._load()
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        # Longer words are more selective; once few candidates are left the
+        # remaining words are checked against those items directly.
+        tokens.sort(key=len, reverse=True)
+        total: Counter = Counter(self._matches(tokens[0]))
+        for token in tokens[1:]:
+            if not total:
+                return []
+            if len(total) <= CANDIDATE_SCAN:
+                for id in list(total):
+                    score = max((self._score(token, t) for t in self._doc_tokens[id]), default=0)
+                    if score:
+                        total[id] += score
+                    else:
+                        del total[id]
+            else:
+                scores = self._matches(token)
+                total = Counter({id: total[id] + score for id, score in scores.items() if id in total})
+        by_kind: Dict[str, List[str]] = {}
+        for id in total:
+            by_kind.setdefault(self._docs[id][0], []).append(id)
+        results = []
+        for ids in by_kind.values():
+            for id in heapq.nsmallest(limit, ids, key=lambda id: (-total[id], self._docs[id][1])):
+                results.append(self._media(id))
+        return results
+
+    def _media(self, id: str) -> Media:
+        kind, name, artist_name, album_name, genres, artwork = self._docs[id]
+        return Media(id, kind, name, artist_name, artwork, album_name, genres)
+
+
+def merge(local: Iterable[Media], remote: Iterable[Media]) -> List[Media]:
+    """Local results first, followed by remote results not already listed"""
+    merged = list(local)
+    seen = {media.id for media in merged}
+    merged.extend(media for media in remote if media.id not in seen)
+    return merged
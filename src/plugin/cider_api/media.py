@@ -1,14 +1,62 @@
 from __future__ import annotations
-from typing import Union
+from typing import Any, Dict, List, Sequence, Tuple, Union
 
 from .artwork import get_artwork
-from ._responses.search_response import song, album, play_params
+from ._responses.search_response import song, album, artists, playlists
+
+# Search result categories and the kind of the items in each.
+KINDS = {"songs": "song", "albums": "album", "artists": "artist", "playlists": "playlist"}
+# Categories searched for unless others are asked for.
+SEARCH_TYPES = ("songs", "albums")
+# Kinds Cider can play, queue, rate and add to the library.
+PLAYABLE_KINDS = ("song", "album", "playlist")
 
 
 class Media:
+    """Immutable record of the few media fields the plugin uses.
+
+    Cider's attribute dicts carry previews, editorial notes, audio traits
+    and more that is never read, so only the fields below are kept. A
+    Media travels through Flow's JSON-RPC as the short list produced by
+    :meth:`to_payload`.
+    """
+
+    __slots__ = ("id", "kind", "name", "artist_name",
+                 "artwork_url", "album_name", "genre_names")
+
+    id: str
+    kind: str
+    name: str
+    artist_name: str
+    artwork_url: str
+    album_name: str
+    genre_names: Tuple[str, ...]
+
+    def __init__(self, id: str, kind: str, name: str, artist_name: str,
+                 artwork_url: str = "", album_name: str = "",
+                 genre_names: Sequence[str] = ()):
+        set_ = object.__setattr__
+        set_(self, "id", id)
+        set_(self, "kind", kind)
+        set_(self, "name", name)
+        set_(self, "artist_name", artist_name)
+        set_(self, "artwork_url", artwork_url)
+        set_(self, "album_name", album_name)
+        set_(self, "genre_names", tuple(genre_names))
 
-    def __init__(self, attributes: Union[song.Attributes, album.Attributes]):
-        self._attributes = attributes
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Media is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Media is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Media):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self) -> int:
+        return hash((self.kind, self.id))
 
     def __repr__(self) -> str:
         return f"<Media name={self.name} artist={self.artist_name}>"
@@ -16,26 +64,63 @@ class Media:
     def __str__(self) -> str:
         return f"{self.name} by {self.artist_name}"
 
-    @property
-    def id(self) -> str:
-        return self._attributes["playParams"]["id"]
+    def _fields(self) -> Tuple:
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    @classmethod
+    def from_attributes(cls, attributes: Union[song.Attributes, album.Attributes, Dict]) -> Media:
+        """Builds a Media from Cider's attributes dict"""
+        play_params = attributes["playParams"]
+        return cls(
+            play_params["id"],
+            play_params["kind"],
+            attributes["name"],
+            attributes["artistName"],
+            attributes.get("artwork", {}).get("url", ""),
+            attributes.get("albumName", ""),
+            attributes.get("genreNames", ()),
+        )
 
-    @property
-    def name(self) -> str:
-        return self._attributes["name"]
+    @classmethod
+    def from_resource(cls, resource: Union[song.Song, album.Album, artists.Artist,
+                                           playlists.Playlist, Dict]) -> Media:
+        """Builds a Media from any item of a search category"""
+        attributes = resource["attributes"]
+        if "playParams" not in attributes:
+            # Artists can't be played, so they come without playParams.
+            attributes = {**attributes, "playParams": {
+                "id": resource["id"], "kind": KINDS.get(resource["type"], resource["type"])}}
+        if "artistName" not in attributes:
+            attributes = {**attributes, "artistName": attributes.get("curatorName", "")}
+        return cls.from_attributes(attributes)
 
-    @property
-    def artist_name(self) -> str:
-        return self._attributes["artistName"]
+    def to_attributes(self) -> Dict[str, Any]:
+        """The subset of Cider's attributes dict this Media holds"""
+        attributes = {
+            "name": self.name,
+            "artistName": self.artist_name,
+            "playParams": {"id": self.id, "kind": self.kind},
+            "artwork": {"url": self.artwork_url},
+        }
+        if self.album_name:
+            attributes["albumName"] = self.album_name
+        if self.genre_names:
+            attributes["genreNames"] = list(self.genre_names)
+        return attributes
 
-    @property
-    def play_params(self) -> play_params.PlayParams:
-        return self._attributes["playParams"]
+    @classmethod
+    def from_payload(cls, payload: Sequence) -> Media:
+        """Builds a Media from the output of :meth:`to_payload`"""
+        return cls(*payload)
 
-    @property
-    def kind(self) -> str:
-        return self.play_params["kind"]
+    def to_payload(self) -> List:
+        """Compact list form passed through Flow's JSON-RPC"""
+        payload = list(self._fields())
+        payload[-1] = list(payload[-1])
+        # Trailing empty optional fields fall back to their defaults.
+        while len(payload) > 4 and not payload[-1]:
+            payload.pop()
+        return payload
 
     def artwork(self, width: int = 32, height: int = 32) -> str:
-        url = self._attributes["artwork"]["url"]
-        return get_artwork(url, width, height)
+        return get_artwork(self.artwork_url, width, height)
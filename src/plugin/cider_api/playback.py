@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import websocket
+from .decoding import loads
+from .web_sockets import SCHEMA
+
+logger = logging.getLogger(__name__)
+
+PLAYBACK_STATE = "playbackStateUpdate"
+
+
+class PlaybackListener:
+    """Keeps the latest playbackStateUpdate Cider pushed to us.
+
+    Cider broadcasts playback state to every connected client, so a
+    background thread on its own connection can keep a current snapshot
+    without asking. Snapshots older than ``max_age`` count as stale and
+    callers should fetch the state explicitly instead. ``on_push`` is
+    called with every pushed state, from the listener's thread.
+    """
+
+    def __init__(self, host: str, port: int, max_age: float = 5,
+                 backoff: float = 0.5, max_backoff: float = 10,
+                 on_push: Optional[Callable[[Dict], None]] = None):
+        self.host = host
+        self.port = port
+        self.on_push = on_push
+        self.max_age = max_age
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._ws = websocket.WebSocket()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._snapshot: Optional[Dict] = None
+        self._updated = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cider-playback", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        # Wakes the thread if it is blocked in recv().
+        self._ws.abort()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        delay = self.backoff
+        while not self._stop.is_set():
+            try:
+                self._ws.connect(f"{SCHEMA}://{self.host}:{self.port}")
+                delay = self.backoff
+                while not self._stop.is_set():
+                    _, data = self._ws.recv_data()
+                    response = loads(data)
+                    if response.get("type") == PLAYBACK_STATE:
+                        self.update(response)
+                        if self.on_push is not None:
+                            self.on_push(response)
+            except Exception as e:
+                logger.debug(f"Playback listener disconnected: {e!r}")
+            finally:
+                self._ws.shutdown()
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def update(self, response: Dict) -> None:
+        with self._lock:
+            self._snapshot = response
+            self._updated = time.time()
+
+    def invalidate(self) -> None:
+        """Marks the snapshot stale, e.g. after changing playback"""
+        with self._lock:
+            self._updated = 0.0
+
+    @property
+    def age(self) -> float:
+        """Seconds since the last update"""
+        with self._lock:
+            return time.time() - self._updated
+
+    @property
+    def stale(self) -> bool:
+        return self._snapshot is None or self.age > self.max_age
+
+    def get(self) -> Optional[Dict]:
+        """The latest playback state, or None if it is stale"""
+        with self._lock:
+            if self._snapshot is None or time.time() - self._updated > self.max_age:
+                return None
+            return self._snapshot
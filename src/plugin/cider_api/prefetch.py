@@ -0,0 +1,92 @@
+from __future__ import annotations
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable, List, Sequence, Tuple
+
+from .cider import Cider
+from .media import PLAYABLE_KINDS, Media
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+ARTWORK_SIZES = ((32, 32), (512, 512))
+
+
+def fetch_url(url: str) -> None:
+    import urllib.request
+    with urllib.request.urlopen(url, timeout=5) as response:
+        response.read()
+
+
+class Prefetcher:
+    """Warms library status and artwork for the top results.
+
+    Users usually open the context menu of one of the first few results,
+    so their library status is fetched ahead of time into Cider's status
+    cache and their artwork is handed to ``fetch``, typically an artwork
+    cache's download method. Work runs on a small thread pool and is
+    dropped once a newer prefetch starts or the ``cancelled`` callback
+    reports a newer query.
+    """
+
+    def __init__(self, cider: Cider, top: int = 3, workers: int = 2,
+                 sizes: Sequence[Tuple[int, int]] = ARTWORK_SIZES,
+                 fetch: Callable[[str], None] = fetch_url):
+        self.cider = cider
+        self.top = top
+        self.workers = workers
+        self.sizes = sizes
+        self.fetch = fetch
+        self._executor = None
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._futures: List[Future] = []
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="cider-prefetch")
+        return self._executor
+
+    def prefetch(self, medias: Sequence[Media],
+                 cancelled: Callable[[], bool] = lambda: False) -> None:
+        self.cancel()
+        with self._lock:
+            generation = self._generation
+            for media in medias[:self.top]:
+                if media.kind in PLAYABLE_KINDS:
+                    self._submit(generation, cancelled,
+                                 self.cider.library_status, media)
+                for width, height in self.sizes:
+                    url = media.artwork(width, height)
+                    if url.startswith(("http://", "https://")):
+                        self._submit(generation, cancelled, self.fetch, url)
+
+    def _submit(self, generation: int, cancelled: Callable[[], bool],
+                method: Callable, *args) -> None:
+        def task():
+            if generation != self._generation or cancelled():
+                return
+            try:
+                method(*args)
+            except Exception as e:
+                logger.debug(f"Prefetch of {args} failed: {e!r}")
+        self._futures.append(self.executor.submit(task))
+
+    def cancel(self) -> None:
+        """Drops prefetches that have not started yet"""
+        with self._lock:
+            self._generation += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures.clear()
+
+    def shutdown(self) -> None:
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
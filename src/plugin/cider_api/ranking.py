@@ -0,0 +1,134 @@
+import math
+import time
+from array import array
+from functools import lru_cache
+from typing import Callable, Container, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .cache import normalize
+from .library_index import tokenize
+from .media import Media
+
+# How much each signal, scaled to 0..1, adds to a result's score.
+WEIGHTS = {
+    "name": 4.0,
+    "artist": 2.0,
+    "prefix": 1.5,
+    "library": 1.0,
+    "recency": 2.0,
+    "frecency": 2.0,
+    "position": 1.0,
+}
+# Time for the recency signal of a play to halve.
+RECENCY_HALF_LIFE = 7 * 24 * 60 * 60
+# Gap between the Flow scores of neighbouring results.
+SCORE_STEP = 10
+
+
+@lru_cache(maxsize=4096)
+def _normalized(text: str) -> str:
+    return normalize(text)
+
+
+@lru_cache(maxsize=4096)
+def _token_set(text: str) -> FrozenSet[str]:
+    return frozenset(tokenize(text))
+
+
+def _coverage(words: Sequence[str], texts: Sequence[str]) -> array:
+    """Share of words found in each text, with a word that only starts a
+    token of the text counting for less than a whole one"""
+    token_sets = [_token_set(text) for text in texts]
+    vocab = frozenset().union(*token_sets)
+    found = [0.0] * len(texts)
+    for word in words:
+        # Matching each word against the tokens of all texts at once turns
+        # the per text checks into set operations.
+        prefixed = frozenset(token for token in vocab
+                             if token.startswith(word) and token != word)
+        for i, tokens in enumerate(token_sets):
+            if word in tokens:
+                found[i] += 1.0
+            elif not prefixed.isdisjoint(tokens):
+                found[i] += 0.7
+    return array("d", [value / len(words) for value in found])
+
+
+class Ranker:
+    """Orders search results from Cider and the library index together.
+
+    Every signal is computed for all candidates at once into its own
+    column, and the columns are then summed with :data:`WEIGHTS`, which
+    keeps ranking a few hundred candidates well under a millisecond.
+    ``library`` is anything supporting ``id in library``, ``played``
+    returns when an item was last played, if ever, and ``frecency`` how
+    often and recently it was used.
+    """
+
+    def __init__(self, library: Optional[Container[str]] = None,
+                 played: Optional[Callable[[Media], Optional[float]]] = None,
+                 frecency: Optional[Callable[[Media], float]] = None,
+                 weights: Optional[Dict[str, float]] = None,
+                 half_life: float = RECENCY_HALF_LIFE):
+        self.library = library
+        self.played = played
+        self.frecency = frecency
+        self.weights = weights if weights is not None else WEIGHTS
+        self.half_life = half_life
+
+    def columns(self, term: str, medias: Sequence[Media]) -> Dict[str, array]:
+        """Each signal for each candidate, in candidate order"""
+        term = _normalized(term)
+        words = term.split()
+        names = [_normalized(media.name) for media in medias]
+        zeros = array("d", bytes(8 * len(medias)))
+        columns = {
+            "name": _coverage(words, names) if words else zeros,
+            "artist": _coverage(words, [media.artist_name.lower() for media in medias])
+            if words else zeros,
+            "prefix": array("d", [1.0 if name == term else 0.5 if term and name.startswith(term)
+                                  else 0.0 for name in names]),
+        }
+        library = self.library
+        columns["library"] = array("d", [
+            1.0 if media.id in library else 0.0 for media in medias]) \
+            if library is not None else zeros
+        if self.played is not None:
+            now = time.time()
+            decay = math.log(2) / self.half_life
+            columns["recency"] = array("d", [
+                math.exp(decay * (last - now)) if last else 0.0
+                for last in map(self.played, medias)])
+        else:
+            columns["recency"] = zeros
+        if self.frecency is not None:
+            columns["frecency"] = array("d", [
+                score / (1 + score) if score > 0 else 0.0
+                for score in map(self.frecency, medias)])
+        else:
+            columns["frecency"] = zeros
+        # Cider lists each kind by its own relevance, best first.
+        seen: Dict[str, int] = {}
+        position = array("d", zeros)
+        for i, media in enumerate(medias):
+            index = seen[media.kind] = seen.get(media.kind, -1) + 1
+            position[i] = 1 / (1 + index)
+        columns["position"] = position
+        return columns
+
+    def scores(self, term: str, medias: Sequence[Media]) -> array:
+        """Weighted sum of every signal for each candidate"""
+        totals = [0.0] * len(medias)
+        for name, column in self.columns(term, medias).items():
+            weight = self.weights.get(name, 0.0)
+            if weight and any(column):
+                totals = [total + weight * value for total, value in zip(totals, column)]
+        return array("d", totals)
+
+    def rank(self, term: str, medias: Sequence[Media]) -> List[Tuple[Media, int]]:
+        """Candidates best first, each with a Flow score that keeps that order"""
+        totals = self.scores(term, medias)
+        # Sorting is stable, also in reverse, so ties keep Cider's order.
+        order = sorted(range(len(medias)), key=totals.__getitem__, reverse=True)
+        count = len(order)
+        return [(medias[i], (count - rank) * SCORE_STEP) for rank, i in enumerate(order)]
+
@@ -0,0 +1,123 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Entries older than this are no longer read, and dropped by compact().
+EXPIRE = 7 * 24 * 60 * 60
+# Keys looked up per query by get_many, below sqlite's limit on parameters.
+MAX_VARIABLES = 500
+
+
+class PersistentStore:
+    """Small sqlite backed key/value store that outlives the plugin process.
+
+    The database is only opened on first use, so constructing a store at
+    startup costs nothing. Values are stored as JSON together with the time
+    they were written, letting callers decide how stale is acceptable.
+    Expired entries are skipped when reading, and only deleted by
+    :meth:`compact`, which is left to idle time.
+    """
+
+    def __init__(self, path: str, expire: float = EXPIRE):
+        self.path = path
+        self.expire = expire
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)")
+        return self._db
+
+    def _oldest(self) -> float:
+        """Time of the oldest entry that hasn't expired"""
+        return time.time() - self.expire
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Returns the stored value and its age in seconds"""
+        with self._lock:
+            try:
+                row = self.db.execute(
+                    "SELECT value, updated FROM entries WHERE key = ? AND updated >= ?",
+                    (key, self._oldest())).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read {key} from {self.path}: {e}")
+                return None
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Tuple[Any, float]]:
+        """Stored values and ages of those keys that are in the store"""
+        rows = []
+        with self._lock:
+            try:
+                for start in range(0, len(keys), MAX_VARIABLES):
+                    chunk = keys[start:start + MAX_VARIABLES]
+                    rows.extend(self.db.execute(
+                        "SELECT key, value, updated FROM entries WHERE updated >= ? AND key IN "
+                        f"({', '.join('?' * len(chunk))})",
+                        (self._oldest(), *chunk)).fetchall())
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read {len(keys)} keys from {self.path}: {e}")
+                return {}
+        now = time.time()
+        return {key: (json.loads(value), now - updated) for key, value, updated in rows}
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, Any]]:
+        """Yields every stored key starting with prefix and its value"""
+        with self._lock:
+            try:
+                rows = self.db.execute(
+                    "SELECT key, value FROM entries WHERE substr(key, 1, ?) = ? "
+                    "AND updated >= ?", (len(prefix), prefix, self._oldest())).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read {prefix}* from {self.path}: {e}")
+                rows = []
+        for key, value in rows:
+            yield key, json.loads(value)
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, updated) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write {key} to {self.path}: {e}")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            try:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not delete {key} from {self.path}: {e}")
+
+    def compact(self) -> None:
+        """Drops expired entries and reclaims their space"""
+        with self._lock:
+            try:
+                self.db.execute("DELETE FROM entries WHERE updated < ?", (self._oldest(),))
+                self.db.execute("VACUUM")
+                # The file only shrinks once the log is checkpointed.
+                self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                # Another process is using the file, the next compaction retries.
+                logger.warning(f"Could not compact {self.path}: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,190 @@
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Durations are counted in buckets a quarter octave wide, starting at 1 us.
+BUCKETS_PER_OCTAVE = 4
+SMALLEST = 1e-6
+# The span log is rotated to a single backup once it grows past this.
+MAX_BYTES = 1024 * 1024
+FLUSH_EVERY = 256
+
+
+class Histogram:
+    """Log bucketed durations, enough for percentiles within ~20%"""
+
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        bucket = 0
+        if seconds > SMALLEST:
+            bucket = int(math.log2(seconds / SMALLEST) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in seconds"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.max, SMALLEST * 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE))
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer: "Tracer", name: str):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.record(self.name, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Collects named durations and appends them to a log file.
+
+    Durations are buffered and written in batches, and at exit. Flow runs
+    the plugin in a new process for every request, so statistics are
+    aggregated from the log rather than kept in memory.
+    """
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES,
+                 flush_every: int = FLUSH_EVERY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self._buffer: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        # Spans end on prefetch and refresh threads too, flush swaps the buffer.
+        with self._lock:
+            self._buffer.append((name, seconds))
+            full = len(self._buffer) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+            if not buffer:
+                return
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            except OSError:
+                pass
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps([name, round(seconds, 7)]) + "\n"
+                                    for name, seconds in buffer))
+            except OSError as e:
+                logger.warning(f"Could not write spans to {self.path}: {e}")
+
+    def histograms(self) -> Dict[str, Histogram]:
+        """Every recorded span, from the log and the current buffer"""
+        self.flush()
+        histograms: Dict[str, Histogram] = {}
+        for path in (f"{self.path}.1", self.path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            name, seconds = json.loads(line)
+                        except ValueError:
+                            continue
+                        histograms.setdefault(name, Histogram()).add(seconds)
+            except FileNotFoundError:
+                continue
+        return histograms
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+            for path in (f"{self.path}.1", self.path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(path: str) -> Tracer:
+    """Starts recording spans to path"""
+    global _tracer
+    if _tracer is None or _tracer.path != path:
+        disable()
+        _tracer = Tracer(path)
+        atexit.register(_tracer.flush)
+    return _tracer
+
+
+def disable() -> None:
+    global _tracer
+    if _tracer is not None:
+        _tracer.flush()
+        atexit.unregister(_tracer.flush)
+        _tracer = None
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str):
+    """Context manager timing its block as name, a no-op unless enabled"""
+    if _tracer is None:
+        return NO_SPAN
+    return _Span(_tracer, name)
+
+
+def record(name: str, seconds: float) -> None:
+    if _tracer is not None:
+        _tracer.record(name, seconds)
@@ -1,24 +1,68 @@
-from dataclasses import dataclass
-from typing import Dict, Optional
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
 import json
+import select
+import socket
+import threading
 import time
 import websocket
 import logging
 
 
+from . import tracing
 from ._responses.base_response import BaseResponse
+from .decoding import loads
 
 logger = logging.getLogger(__name__)
 
 SCHEMA = "ws"
+RECONNECT_ERRORS = (websocket.WebSocketConnectionClosedException,
+                    ConnectionResetError, BrokenPipeError)
+CONNECT_TIMEOUT = 2
+# Connections a pool keeps to Cider at most.
+POOL_SIZE = 4
+# Seconds a pooled connection may sit unused before it is closed.
+MAX_IDLE = 60
+
+
+@dataclass
+class Request:
+    id: int
+    response_type: str
+    response: Optional[BaseResponse] = field(default=None, repr=False)
+    sent: float = field(default=0.0, repr=False)
+    # Set when the connection the request was sent on is dropped.
+    error: Optional[Exception] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.response is not None or self.error is not None
 
 
 class WebSocket:
+    """Long-lived connection to Cider shared by many requests.
+
+    The socket is opened lazily on the first request and reopened with
+    exponential backoff if it drops. Cider does not echo an identifier
+    back, so every reply is handed to the oldest outstanding request
+    waiting on that message type, whatever order the types arrive in.
+    Frames nobody waits for, such as playback pushes, are dropped. Reads
+    are bounded by the socket timeout, so a silent Cider can't block a
+    request past its deadline. One thread may use it at a time, threads
+    share connections through a ConnectionPool.
+    """
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, retries: int = 3, backoff: float = 0.05):
         self.host = host
         self.port = port
+        self.retries = retries
+        self.backoff = backoff
         self._ws = websocket.WebSocket()
+        self._ids = count(1)
+        self._waiting: Dict[str, Deque[Request]] = {}
 
     def __enter__(self):
         self._connect()
@@ -31,41 +75,270 @@ class WebSocket:
     def _url(self) -> str:
         return f"{SCHEMA}://{self.host}:{self.port}"
 
+    @property
+    def connected(self) -> bool:
+        return self._ws.connected
+
+    def healthy(self) -> bool:
+        """Connected, and not closed by Cider while it sat unused.
+
+        Pushes that arrived meanwhile are read and dropped, nobody waits
+        on them, after which the end of the stream shows without a round
+        trip.
+        """
+        sock = self._ws.sock
+        if sock is None or not self.connected:
+            return False
+        try:
+            while select.select([sock], [], [], 0)[0]:
+                if sock.recv(1, socket.MSG_PEEK) == b"":
+                    return False
+                self._ws.settimeout(CONNECT_TIMEOUT)
+                opcode, _ = self._ws.recv_data()
+                if opcode == websocket.ABNF.OPCODE_CLOSE:
+                    return False
+        except (OSError, ValueError, websocket.WebSocketException):
+            return False
+        return True
+
     def _connect(self) -> None:
-        logger.debug(f"Connecting to {self._url}")
-        self._ws.connect(self._url)
+        if self.connected:
+            return
+        delay = self.backoff
+        for attempt in range(1, self.retries + 1):
+            logger.debug(f"Connecting to {self._url} (attempt {attempt})")
+            try:
+                with tracing.span("ws.connect"):
+                    self._ws.connect(self._url, timeout=CONNECT_TIMEOUT)
+                return
+            except OSError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def _disconnect(self, abort: bool = False) -> None:
+        if self.connected:
+            logger.debug(f"Disconnecting from {self._url}")
+        if abort:
+            # Skips the closing handshake, which would wait on the same
+            # unresponsive stream.
+            self._ws.shutdown()
+        else:
+            self._ws.close()
+        # Replies to anything still outstanding died with the socket, fail
+        # them now rather than at their deadline.
+        for waiting in self._waiting.values():
+            for request in waiting:
+                request.error = ConnectionError(
+                    f"Connection to Cider closed before the {request.response_type} reply")
+        self._waiting.clear()
+
+    def close(self, abort: bool = False) -> None:
+        self._disconnect(abort)
+
+    def submit(self, message: Dict, response_type: str = "generic") -> Request:
+        """Sends a message without waiting for the reply."""
+        self._connect()
+        request = Request(next(self._ids), response_type)
+        logger.debug(f"Sending message {message} as request {request.id}")
+        payload = json.dumps(message)
+        with tracing.span("ws.send"):
+            try:
+                self._ws.send(payload)
+            except RECONNECT_ERRORS:
+                self._disconnect()
+                self._connect()
+                self._ws.send(payload)
+        request.sent = time.perf_counter()
+        self._waiting.setdefault(response_type, deque()).append(request)
+        return request
 
-    def _disconnect(self) -> None:
-        logger.debug(f"Disconnecting from {self._url}")
-        self._ws.close()
+    def _dispatch(self, response: BaseResponse) -> None:
+        type = response.get("type") if isinstance(response, dict) else None
+        waiting = self._waiting.get(type)
+        if not waiting:
+            logger.debug(f"Ignoring unsolicited {type} message")
+            return
+        request = waiting.popleft()
+        request.response = response
+        logger.debug(f"Received response for request {request.id}")
 
-    def send(self, message: Dict, response_type: Optional[str] = None, timeout: int = 10) -> Dict:
-        logger.debug(f"Sending message {message}")
+    def _recv(self) -> BaseResponse:
+        # recv_data() skips decoding text frames to str; both JSON backends
+        # accept the raw UTF-8 bytes.
+        _, data = self._ws.recv_data()
+        with tracing.span("ws.decode"):
+            return loads(data)
+
+    def result(self, request: Request, timeout: float = 10) -> BaseResponse:
+        """Reads frames until the given request has been answered."""
+        deadline = time.monotonic() + timeout
+        first = True
+        previous_timeout = self._ws.gettimeout()
         try:
-            self._connect()
-            self._ws.send(json.dumps(message))
-            start = time.time()
-            while True:
-                response = json.loads(self._ws.recv())
-                if response["type"] == response_type or response_type is None:
-                    logger.debug(f"Received response {response}")
-                    break
-                if time.time() - start > timeout:
-                    raise TimeoutError("Timed out waiting for response")
-                time.sleep(0.1)
-            self._disconnect()
-            return response
+            while not request.done:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out waiting for {request.response_type} response")
+                self._ws.settimeout(remaining)
+                try:
+                    response = self._recv()
+                except websocket.WebSocketTimeoutException:
+                    raise TimeoutError(
+                        f"Timed out waiting for {request.response_type} response") from None
+                if first:
+                    tracing.record("ws.first_frame", time.perf_counter() - request.sent)
+                    first = False
+                self._dispatch(response)
         except Exception as e:
             logger.exception(e)
+            # A frame may have been cut short, so the stream can't be trusted.
+            self._disconnect(abort=True)
             raise e
         finally:
-            self._disconnect()
-
-    def action(self, action: str, status: str = "generic", **kwargs) -> Dict:
-        message = {"action": action, "status": status, **kwargs}
-        self._ws.send(message)
-        while True:
-            response = json.loads(self._ws.recv())
-            if response["type"] == status:
-                break
-        return response
+            # Later sends would otherwise be bound by what was left of this wait.
+            if self.connected:
+                self._ws.settimeout(previous_timeout)
+        if request.error is not None:
+            raise request.error
+        tracing.record("ws.reply", time.perf_counter() - request.sent)
+        return request.response
+
+    def send(self, message: Dict, response_type: str = "generic", timeout: float = 10) -> BaseResponse:
+        return self.result(self.submit(message, response_type), timeout)
+
+
+class _Waiter:
+    """A caller waiting for a connection, handed one in turn"""
+    __slots__ = ("ready", "connection")
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.connection: Optional[WebSocket] = None
+
+
+class ConnectionPool:
+    """Bounded set of connections to Cider, each used by one caller at a time.
+
+    A caller checks a connection out for as long as its requests are in
+    flight, so replies are never read by another thread. Connections
+    are opened as callers need them, up to size, after which callers
+    queue and each connection checked in goes to the longest waiting
+    one. Otherwise the most recently used connection is handed out
+    first, which lets the rest go idle and be closed after max_idle
+    seconds. A connection Cider has closed meanwhile is reopened before
+    it is handed out.
+    """
+
+    def __init__(self, host: str, port: int, size: int = POOL_SIZE,
+                 max_idle: float = MAX_IDLE):
+        if size < 1:
+            raise ValueError("A pool needs room for at least one connection")
+        self.host = host
+        self.port = port
+        self.size = size
+        self.max_idle = max_idle
+        self._idle: List[Tuple[WebSocket, float]] = []
+        self._waiters: Deque[_Waiter] = deque()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "evicted": 0, "reconnected": 0, "waited": 0}
+
+    @property
+    def in_use(self) -> int:
+        with self._lock:
+            return self._opened - len(self._idle)
+
+    def _evict(self) -> List[WebSocket]:
+        # The idle list is ordered by last use, oldest first.
+        cutoff = time.monotonic() - self.max_idle
+        stale = 0
+        while stale < len(self._idle) and self._idle[stale][1] < cutoff:
+            stale += 1
+        evicted = [connection for connection, _ in self._idle[:stale]]
+        del self._idle[:stale]
+        self._opened -= stale
+        self.stats["evicted"] += stale
+        return evicted
+
+    def _wait(self, waiter: _Waiter, timeout: float) -> WebSocket:
+        waiter.ready.wait(timeout)
+        with self._lock:
+            if waiter.connection is None:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                raise TimeoutError(
+                    f"No connection to Cider free within {timeout:g} seconds")
+        return waiter.connection
+
+    def checkout(self, timeout: float) -> WebSocket:
+        """A connection for the caller alone, waiting at most timeout
+        seconds for one to be checked in when all of them are in use."""
+        connection: Optional[WebSocket] = None
+        waiter: Optional[_Waiter] = None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            evicted = self._evict()
+            if self._idle:
+                connection, _ = self._idle.pop()
+            elif self._opened < self.size:
+                self._opened += 1
+                self.stats["opened"] += 1
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+                self.stats["waited"] += 1
+        for stale in evicted:
+            stale.close(abort=True)
+        if waiter is not None:
+            connection = self._wait(waiter, timeout)
+        if connection is None:
+            # Connects on its first request, outside the lock.
+            return WebSocket(self.host, self.port)
+        if connection.connected and not connection.healthy():
+            logger.debug("Reopening a pooled connection Cider has closed")
+            connection.close(abort=True)
+            with self._lock:
+                self.stats["reconnected"] += 1
+        return connection
+
+    def checkin(self, connection: WebSocket) -> None:
+        """Returns a connection checked out before"""
+        with self._lock:
+            if not self._closed:
+                if self._waiters:
+                    waiter = self._waiters.popleft()
+                    waiter.connection = connection
+                    waiter.ready.set()
+                else:
+                    self._idle.append((connection, time.monotonic()))
+                return
+            self._opened -= 1
+        connection.close()
+
+    @contextmanager
+    def connection(self, timeout: float) -> Iterator[WebSocket]:
+        connection = self.checkout(timeout)
+        try:
+            yield connection
+        finally:
+            self.checkin(connection)
+
+    def close(self) -> None:
+        """Closes idle connections, and the rest once they are checked in"""
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._opened -= len(idle)
+            self._idle.clear()
+            for waiter in self._waiters:
+                waiter.ready.set()
+            self._waiters.clear()
+        for connection in idle:
+            connection.close()
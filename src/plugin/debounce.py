@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from cider_api.file_lock import locked
+
+MIN_DELAY = 0.05
+MAX_DELAY = 0.5
+# Keystrokes further apart than this belong to a new burst of typing.
+BURST_GAP = 2.0
+
+
+class Debouncer:
+    """Delays a query until the user has likely stopped typing.
+
+    The delay follows a moving average of the gap between keystrokes and
+    drops to ``min_delay`` when a query did not grow by a single character,
+    which is what pasting or picking from history looks like. A query is
+    dropped when a newer one arrives while it waits.
+
+    Flow starts a new process for every keystroke, so when ``state_path``
+    is given the timing and the latest query are shared through that file.
+    It is only read and replaced while holding a lock file next to it.
+    """
+
+    def __init__(self, min_delay: float = MIN_DELAY, max_delay: float = MAX_DELAY,
+                 smoothing: float = 0.3, state_path: Optional[str] = None):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.smoothing = smoothing
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._state = {
+            "generation": 0,
+            "query": "",
+            "time": 0.0,
+            "gap": max_delay,
+            "delay": max_delay,
+            "executed": 0,
+            "cancelled": 0,
+        }
+
+    def _load(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, "r") as f:
+                self._state.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self._state, f)
+            os.replace(tmp, self.state_path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _shared(self) -> Iterator[None]:
+        # Holds the state, loaded from the file, for reading and updating.
+        with self._lock, ExitStack() as stack:
+            if self.state_path:
+                try:
+                    stack.enter_context(locked(f"{self.state_path}.lock"))
+                except OSError:
+                    # Better a racy update than no search at all.
+                    pass
+                self._load()
+            yield
+
+    def _next_delay(self, query: str, now: float) -> float:
+        state = self._state
+        gap = now - state["time"]
+        previous = state["query"]
+        typed = abs(len(query) - len(previous)) == 1 and (
+            query.startswith(previous) or previous.startswith(query))
+        if not typed or gap > BURST_GAP:
+            return self.min_delay
+        state["gap"] = self.smoothing * gap + \
+            (1 - self.smoothing) * state["gap"]
+        return min(self.max_delay, max(self.min_delay, state["gap"] * 1.5))
+
+    def wait(self, query: str) -> bool:
+        """Blocks for the debounce delay.
+
+        Returns False if a newer query arrived in the meantime, in which
+        case this one should not be searched for.
+        """
+        with self._shared():
+            now = time.time()
+            delay = self._next_delay(query, now)
+            generation = self._state["generation"] + 1
+            self._state.update(generation=generation, query=query,
+                               time=now, delay=delay)
+            self._save()
+        time.sleep(delay)
+        with self._shared():
+            current = self._state["generation"] == generation
+            self._state["executed" if current else "cancelled"] += 1
+            self._save()
+            return current
+
+    def generation(self) -> int:
+        """Number of the latest query, for superseded to compare with"""
+        with self._shared():
+            return self._state["generation"]
+
+    def superseded(self, generation: int) -> bool:
+        """True once a query newer than generation arrived"""
+        return self.generation() != generation
+
+    def stats(self) -> Dict[str, Any]:
+        """Current delay and counters, for tuning"""
+        with self._shared():
+            return {key: self._state[key] for key in ("delay", "gap", "executed", "cancelled")}
@@ -0,0 +1,325 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import logging
+    from main import FlowCider
+
+# Argument __main__ is started with to run the host instead of a request.
+HOST_ARG = "--host"
+# Written by the host to the plugin's data directory, read by launchers.
+ADDRESS_FILE = "host.json"
+# Marks a host as starting, so keystrokes meanwhile don't start more.
+LOCK_FILE = "host.lock"
+PLUGIN_MANIFEST = "plugin.json"
+# Seconds without a request after which the host exits.
+IDLE_TIMEOUT = 15 * 60
+# Seconds without a request after which the plugin's stores are compacted.
+COMPACT_AFTER = 60
+# Seconds a host may take to start listening before another is started.
+START_TIMEOUT = 10
+CONNECT_TIMEOUT = 0.5
+# Long enough for the slowest action, a batch of Cider requests.
+REPLY_TIMEOUT = 60
+# What Flow sends when a plugin is started without a request.
+DEFAULT_REQUEST = json.dumps({"method": "query", "parameters": [""]})
+# Requests that may be answered again in-process if the host fails midway.
+IDEMPOTENT = ("query", "context_menu")
+
+
+def plugin_dir() -> str:
+    """Directory holding plugin.json, found the way flox does"""
+    path = os.path.abspath(os.getcwd())
+    while not os.path.exists(os.path.join(path, PLUGIN_MANIFEST)):
+        if os.path.ismount(path):
+            return os.getcwd()
+        path = os.path.dirname(path)
+    return path
+
+
+def data_dir() -> str:
+    """Directory of the plugin's Settings.json, without importing flox"""
+    plugindir = plugin_dir()
+    with open(os.path.join(plugindir, PLUGIN_MANIFEST), "r", encoding="utf-8") as f:
+        name = json.load(f)["Name"]
+    appdata = os.path.dirname(os.path.dirname(plugindir))
+    return os.path.join(appdata, "Settings", "Plugins", name)
+
+
+def installation() -> Dict[str, Optional[str]]:
+    """The installed plugin a host runs the code of.
+
+    Every version of the plugin shares the settings directory and with it
+    the address file, so a launcher only forwards to a host of its own.
+    """
+    plugindir = plugin_dir()
+    manifest = _read_json(os.path.join(plugindir, PLUGIN_MANIFEST))
+    return {"version": manifest.get("Version"), "plugindir": plugindir}
+
+
+def _read_json(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _send(sock: socket.socket, address: Dict, request: Optional[str]) -> bytes:
+    """Sends a request to the host, or asks it to exit when request is None"""
+    message = {"token": address["token"], "request": request}
+    if request is None:
+        message = {"token": address["token"], "stop": True}
+    with sock:
+        sock.settimeout(REPLY_TIMEOUT)
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+def _start_host(directory: str) -> None:
+    lock = os.path.join(directory, LOCK_FILE)
+    try:
+        if time.time() - os.path.getmtime(lock) < START_TIMEOUT:
+            return
+    except OSError:
+        pass
+    try:
+        open(lock, "w").close()
+    except OSError:
+        return
+    import subprocess
+    if os.name == "nt":
+        options = {"creationflags": subprocess.DETACHED_PROCESS
+                   | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {"start_new_session": True}
+    # Flow reads our stdout until it closes, the host must not inherit it.
+    subprocess.Popen([sys.executable, sys.argv[0], HOST_ARG], cwd=os.getcwd(),
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, close_fds=True, **options)
+
+
+def forward(args: List[str]) -> bool:
+    """Answers a request through the resident host, when enabled.
+
+    Returns False if the request has to be answered by this process,
+    because the host is turned off, not running yet, runs another version
+    of the plugin or failed to answer. A host is started in the
+    background when there is none of this version, for the requests
+    after this.
+    """
+    try:
+        directory = data_dir()
+    except (OSError, ValueError, KeyError):
+        return False
+    if not _read_json(os.path.join(directory, "Settings.json")).get("resident"):
+        return False
+    request = args[0] if args else DEFAULT_REQUEST
+    address = _read_json(os.path.join(directory, ADDRESS_FILE))
+    try:
+        sock = socket.create_connection(("127.0.0.1", address["port"]), CONNECT_TIMEOUT)
+    except (KeyError, OSError):
+        # Not started yet, or gone since it wrote the address file.
+        _start_host(directory)
+        return False
+    if any(address.get(key) != value for key, value in installation().items()):
+        # Left running by another version of the plugin, replace it.
+        try:
+            _send(sock, address, None)
+        except OSError:
+            pass
+        _start_host(directory)
+        return False
+    idempotent = json.loads(request).get("method") in IDEMPOTENT
+    try:
+        reply = _send(sock, address, request)
+    except OSError:
+        # The host may have acted on the request already.
+        return not idempotent
+    if not reply and idempotent:
+        # Queries are always answered with results, the host failed midway.
+        return False
+    sys.stdout.buffer.write(reply)
+    sys.stdout.flush()
+    return True
+
+
+class PluginHost:
+    """Answers Flow's requests from one long lived plugin.
+
+    The plugin, and with it the connection to Cider, its caches and
+    parsed queries, is kept between requests and rebuilt when its
+    settings file changes, keeping the logger the first one set up. Requests are answered one at a time, so a
+    query still waiting its turn when a newer one arrives is answered
+    with no results, which takes the place of debouncing.
+    """
+
+    def __init__(self, factory: Callable[[], FlowCider]):
+        self.factory = factory
+        self.plugin: Optional[FlowCider] = None
+        self._logger: Optional[logging.Logger] = None
+        self.last_request = time.monotonic()
+        self._settings_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._queries_lock = threading.Lock()
+
+    def _settings_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.plugin.settings_path)
+        except OSError:
+            mtime = None
+        changed, self._settings_mtime = mtime != self._settings_mtime, mtime
+        return changed
+
+    def current(self) -> FlowCider:
+        if self.plugin is not None and not self._settings_changed():
+            return self.plugin
+        if self.plugin is not None:
+            self.plugin.close()
+        import logging
+        from debounce import Debouncer
+        plugin = self.factory()
+        if self._logger is None:
+            self._logger = plugin.logger
+        else:
+            # flox adds a file handler to the root logger each time a plugin
+            # sets up its logger, which would write every line again.
+            self._logger.setLevel(logging.WARNING)
+            plugin.logger = self._logger
+        plugin.hosted = True
+        plugin.debouncer = Debouncer(min_delay=0, max_delay=0)
+        plugin.cider.subscribe()
+        self.plugin = plugin
+        self._settings_changed()
+        return plugin
+
+    def answer(self, request: str) -> str:
+        self.last_request = time.monotonic()
+        query = json.loads(request).get("method") == "query"
+        with self._queries_lock:
+            self._queries += query
+            generation = self._queries
+        with self._lock:
+            if query and generation != self._queries:
+                return json.dumps({"result": []})
+            return self.current().answer(request)
+
+    def compact(self) -> None:
+        """Tidies the plugin's stored data between requests"""
+        with self._lock:
+            if self.plugin is not None:
+                self.plugin.compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.plugin is not None:
+                self.plugin.close()
+                self.plugin = None
+
+
+def error_reply(request: str, exception: Exception) -> str:
+    """What flox prints for a request that raised exception"""
+    try:
+        method = json.loads(request).get("method")
+    except (ValueError, AttributeError):
+        method = None
+    if method not in IDEMPOTENT:
+        return ""
+    plugindir = plugin_dir()
+    manifest = _read_json(os.path.join(plugindir, PLUGIN_MANIFEST))
+    return json.dumps({"result": [{
+        "Title": exception.__class__.__name__,
+        "SubTitle": str(exception),
+        "IcoPath": os.path.join(plugindir, manifest.get("IcoPath", "")),
+    }]})
+
+
+def serve(idle_timeout: Optional[float] = None,
+          factory: Optional[Callable[[], FlowCider]] = None,
+          compact_after: float = COMPACT_AFTER) -> None:
+    """Runs the resident host until it has been idle for idle_timeout"""
+    import logging
+    import secrets
+    import socketserver
+    if factory is None:
+        from main import FlowCider as factory
+
+    logger = logging.getLogger(__name__)
+    host = PluginHost(factory)
+    plugin = host.current()
+    directory = plugin.data_dir
+    if idle_timeout is None:
+        idle_timeout = plugin.settings.get("idle_timeout", IDLE_TIMEOUT)
+    token = secrets.token_hex(16)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                message = json.loads(self.rfile.readline())
+            except ValueError:
+                return
+            if not secrets.compare_digest(str(message.get("token")), token):
+                return
+            if message.get("stop"):
+                # Asked by a launcher of another version of the plugin.
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+            request = message.get("request") or DEFAULT_REQUEST
+            try:
+                reply = host.answer(request)
+            except Exception as e:
+                logger.exception(e)
+                reply = error_reply(request, e)
+            self.wfile.write(reply.encode())
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+
+    with Server(("127.0.0.1", 0), Handler) as server:
+        address = {"pid": os.getpid(), "port": server.server_address[1], "token": token,
+                   **installation()}
+        path = os.path.join(directory, ADDRESS_FILE)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(address, f)
+        os.replace(tmp, path)
+        try:
+            os.remove(os.path.join(directory, LOCK_FILE))
+        except OSError:
+            pass
+
+        def watch():
+            compacted = None
+            while time.monotonic() - host.last_request < idle_timeout:
+                time.sleep(min(1.0, idle_timeout, compact_after))
+                last_request = host.last_request
+                if compacted != last_request and \
+                        time.monotonic() - last_request >= compact_after:
+                    compacted = last_request
+                    try:
+                        host.compact()
+                    except Exception as e:
+                        logger.exception(e)
+            server.shutdown()
+
+        threading.Thread(target=watch, daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            # A newer host may have taken over the address file.
+            if _read_json(path).get("pid") == os.getpid():
+                os.remove(path)
+            host.close()
@@ -1,34 +1,214 @@
+import io
+import json
+import os
+import sys
 import time
+from contextlib import redirect_stdout
+from functools import cached_property
+from typing import List, Optional, Sequence
 
 from flox import Flox
-from parse_args import parse_args
-from cider_api.cider import Cider
-from cider_api.media import Media
-from results import (search_results, argument_results,
+from debounce import Debouncer
+from parse_args import parse_query, with_option
+from cider_api import artwork, tracing
+from cider_api.artwork_cache import ArtworkCache
+from cider_api.cache import SearchPage
+from cider_api.cider import BASE_HOST, BASE_PORT, Cider
+from cider_api.history import PlayHistory
+from cider_api.library_index import LibraryIndex, merge
+from cider_api.prefetch import Prefetcher
+from cider_api.ranking import Ranker
+from cider_api.store import PersistentStore
+from cider_api.media import KINDS, SEARCH_TYPES, Media
+from render import ResultRenderer, dumps
+from results import (search_results, hint_results, stats_results,
                      exception_results, now_playing, context_menu_results)
 
+# Queries up to this long show matching favourites instead of searching.
+SHORT_QUERY = 2
+# Hidden query listing how long each step of a request takes.
+STATS_QUERY = ":stats"
+# Favourites listed below now playing for an empty query.
+TOP_ITEMS = 5
+# The stores are compacted at most this often, when idle.
+COMPACT_INTERVAL = 24 * 60 * 60
+COMPACTED_KEY = "compacted"
+
 
 class FlowCider(Flox):
 
+    # Set by the resident host, which answers through answer() and must not
+    # have a request answered when the plugin is collected.
+    hosted = False
+
     def __init__(self):
         super().__init__()
-        self.cider = Cider()
+        if self.settings.get("trace"):
+            tracing.enable(self.trace_path)
+        self.cider = Cider(
+            self.settings.get("host", BASE_HOST),
+            self.settings.get("port", BASE_PORT),
+            pool_size=self.settings.get("pool_size"),
+            store=PersistentStore(os.path.join(self.data_dir, "cache.sqlite3")),
+            library=LibraryIndex(PersistentStore(
+                os.path.join(self.data_dir, "library.sqlite3"), expire=float("inf"))),
+        )
+        self.debouncer = Debouncer(
+            state_path=os.path.join(self.data_dir, "debounce.json"))
+        self.artwork_cache = ArtworkCache(os.path.join(self.data_dir, "artwork"))
+        artwork.use_cache(self.artwork_cache)
+        self.prefetcher = Prefetcher(self.cider, fetch=self.artwork_cache.fetch)
+        self.history = PlayHistory(os.path.join(self.data_dir, "history.jsonl"))
+        self.ranker = Ranker(self.cider.library, played=self.history.last_played,
+                             frecency=self.history.score)
 
-    def query(self, query: str):
+    def run(self, debug=None):
+        if self.hosted:
+            return
+        self._respond(debug)
+        # Flow reads our output until stdout closes. Point it elsewhere so
+        # background refreshes and prefetches don't hold the response back.
+        sys.stdout.flush()
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        self.compact()
+
+    def answer(self, request: str) -> str:
+        """Handles one JSON-RPC request from Flow, returning what a plugin
+        process would have printed for it"""
+        self._results = []
+        self._start = time.time()
+        argv, sys.argv = sys.argv, [sys.argv[0], request]
         try:
-            if query.strip():
-                # Need to delay the search to allow the user to type.
-                time.sleep(0.5)
-                args, actions = parse_args(query)
-                if " ".join(args.query).endswith(":"):
-                    return argument_results(self, args, actions)
-                results = self.cider.search(
-                    " ".join(args.query), limit=args.limit)
-                return search_results(self, args, results)
-            else:
-                return now_playing(self)
+            with redirect_stdout(io.StringIO()) as output:
+                self._respond()
+        finally:
+            sys.argv = argv
+        return output.getvalue()
+
+    def _respond(self, debug=None):
+        """Answers the request in sys.argv.
+
+        Search results are rendered to JSON fragments, which flox would
+        write as strings, so queries are answered here and everything
+        else is left to flox.
+        """
+        request = json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}
+        if request.get("method", "query") != "query":
+            return super().run(debug)
+        self.rpc_request = request
+        if "settings" in request:
+            self._settings = request["settings"]
+        if not self._debug:
+            self._debug = self.settings.get("debug", False)
+        if self._debug:
+            self.logger_level("debug")
+        try:
+            self._query(*request.get("parameters", [""]))
         except Exception as e:
-            return exception_results(self, e)
+            self.logger.exception(e)
+            self.exception(e)
+        response = {"result": self._results}
+        if self._settings != request.get("Settings") and self._settings is not None:
+            response["SettingsChange"] = self.settings
+        # One write, the response can run to hundreds of kilobytes.
+        sys.stdout.write(dumps(response) + "\n")
+
+    def close(self):
+        self.prefetcher.shutdown()
+        self.cider.close()
+
+    def compact(self, interval: float = COMPACT_INTERVAL):
+        """Drops expired entries from the stores, unless that was done in
+        the last interval seconds. Left until Flow has its response."""
+        store = self.cider.store
+        done = store.get(COMPACTED_KEY)
+        if done is not None and done[1] < interval:
+            return
+        store.put(COMPACTED_KEY, True)
+        store.compact()
+        self.cider.library.store.compact()
+
+    @cached_property
+    def data_dir(self) -> str:
+        path = os.path.dirname(self.settings_path)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @cached_property
+    def renderer(self) -> ResultRenderer:
+        return ResultRenderer(self.user_keyword, os.path.join(self.plugindir, self.icon))
+
+    @cached_property
+    def trace_path(self) -> str:
+        return os.path.join(self.data_dir, "trace.jsonl")
+
+    def query(self, query: str):
+        with tracing.span("query"):
+            try:
+                return self._query_results(query)
+            except Exception as e:
+                return exception_results(self, e)
+
+    def _query_results(self, query: str):
+        if not query.strip():
+            top = self.history.top(TOP_ITEMS)
+            if top:
+                search_results(self, parse_query(""), top, from_history=True)
+            return now_playing(self)
+        if query.strip() == STATS_QUERY:
+            return stats_results(self)
+        with tracing.span("parse"):
+            parsed = parse_query(query)
+        if parsed.hints:
+            return hint_results(self, parsed)
+        if len(parsed.term) <= SHORT_QUERY and not (parsed.type or parsed.by):
+            # Too short to search for, but enough to pick a favourite.
+            top = self.history.top(parsed.limit, parsed.term)
+            if top:
+                return search_results(self, parsed, top, from_history=True)
+        # Give the user a chance to keep typing before searching.
+        with tracing.span("debounce"):
+            if not self.debouncer.wait(query):
+                return
+        types = (parsed.type,) if parsed.type else SEARCH_TYPES
+        with tracing.span("search"):
+            page = self.search(parsed.term, parsed.limit, types, parsed.by, parsed.page)
+        next_query = with_option(query, ":page", parsed.page + 1) if page.more else None
+        return search_results(self, parsed, page.results, next_query=next_query)
+
+    def set_tracing(self, enabled: bool):
+        self.settings["trace"] = enabled
+        if enabled:
+            tracing.enable(self.trace_path)
+        else:
+            tracing.disable()
+
+    def reset_stats(self):
+        tracing.Tracer(self.trace_path).reset()
+
+    def search(self, term: str, limit: int, types: Sequence[str] = SEARCH_TYPES,
+               artist: Optional[str] = None, page: int = 1) -> SearchPage:
+        """One page of catalog results, the first with library matches"""
+        local: List[Media] = []
+        if page == 1:
+            kinds = {KINDS[type] for type in types}
+            local = [media for media in self.cider.library.search(term, limit=limit)
+                     if media.kind in kinds
+                     and (not artist or artist.lower() in media.artist_name.lower())]
+        try:
+            remote = self.cider.search_page(term, limit, types, page - 1, artist)
+        except (ConnectionError, TimeoutError):
+            # Library matches are still worth showing without Cider.
+            if not local:
+                raise
+            remote = SearchPage([], 0)
+        return SearchPage(merge(local, remote.results), remote.offset, remote.next)
+
+    def prefetch(self, results: List[Media]) -> None:
+        # Taken now, results from history are shown without waiting first.
+        generation = self.debouncer.generation()
+        self.prefetcher.prefetch(
+            results, cancelled=lambda: self.debouncer.superseded(generation))
 
     def context_menu(self, data):
         try:
@@ -37,8 +217,9 @@ class FlowCider(Flox):
             return exception_results(self, e)
 
     def play_media(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.play_media(media)
+        self.history.record(media, "play")
 
     def play_pause(self):
         self.cider.play_pause()
@@ -47,25 +228,38 @@ class FlowCider(Flox):
         self.cider.open()
 
     def play_media_next(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.play_media_next(media)
+        self.history.record(media, "next")
 
     def play_media_last(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.play_media_last(media)
+        self.history.record(media, "later")
+
+    def play_all_later(self, term, limit, kind, artist=None):
+        types = [type for type in KINDS if KINDS[type] == kind]
+        medias = [media for media in self.search(term, limit, types, artist).results
+                  if media.kind == kind]
+        results = self.cider.play_later_many(medias)
+        self.history.record_many(
+            [result.media for result in results if result.ok], "later")
 
     def like_media(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.rate_media(media, "like")
+        self.history.record(media, "like")
 
     def dislike_media(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.rate_media(media, "dislike")
+        self.history.record(media, "dislike")
 
     def unrate_media(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.rate_media(media, "unrate")
+        self.history.record(media, "unrate")
 
     def toggle_library(self, result):
-        media = Media(result)
+        media = Media.from_payload(result)
         self.cider.toggle_library(media)
@@ -1,25 +1,143 @@
-import argparse
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
 
 
 FLAG_CHAR = ':'
-CHOICES = ["songs", "albums"]
+# Wraps an option value of several words, such as an artist's name.
+QUOTE = '"'
+CHOICES = ["songs", "albums", "artists", "playlists"]
+DEFAULT_LIMIT = 20
 
 
-def parse_args(input: str) -> Tuple[argparse.Namespace, List[argparse.Action]]:
-    parser = argparse.ArgumentParser(prefix_chars=FLAG_CHAR, add_help=False)
-    parser.add_argument('query', type=str, nargs='*',
-                        help='Query to search for')
-    parser.add_argument(':limit', type=int, default=20, nargs='?',
-                        help='Limit of results to return for each type')
-    parser.add_argument(':by', type=str, nargs='?', help='Filter by [artist]')
-    parser.add_argument(':type', type=str, nargs='?',
-                        help=f'Filter by [{"|".join(CHOICES)}]')
+class Option(NamedTuple):
+    name: str
+    help: str
+    convert: Callable[[str], object] = str
+    choices: Tuple[str, ...] = ()
 
-    return parser.parse_intermixed_args(input.split()), parser._actions
 
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"{value} is not a positive number")
+    return number
+
+
+OPTIONS: Dict[str, Option] = {option.name: option for option in (
+    Option(':limit', 'Limit of results to return for each type', _positive_int),
+    Option(':by', 'Filter by [artist], in quotes if it has several words'),
+    Option(':type', f'Filter by [{"|".join(CHOICES)}]', choices=tuple(CHOICES)),
+    Option(':page', 'Page of results to show', _positive_int),
+)}
+
+
+class Hint(NamedTuple):
+    """A completion for the last word of the query"""
+    text: str
+    help: str
+
+
+class Query(NamedTuple):
+    words: Tuple[str, ...] = ()
+    limit: int = DEFAULT_LIMIT
+    by: Optional[str] = None
+    type: Optional[str] = None
+    page: int = 1
+    # Completions for an option or option value still being typed.
+    hints: Tuple[Hint, ...] = ()
+    # Everything before the word the hints complete.
+    prefix: str = ''
+
+    @property
+    def term(self) -> str:
+        return ' '.join(self.words)
+
+
+def _hints(tokens: Tuple[str, ...]) -> Tuple[Hint, ...]:
+    last = tokens[-1]
+    if last in OPTIONS:
+        option = OPTIONS[last]
+        return tuple(Hint(f'{last} {choice}', option.help) for choice in option.choices)
+    if last.startswith(FLAG_CHAR):
+        return tuple(Hint(name, option.help) for name, option in OPTIONS.items()
+                     if name.startswith(last))
+    if len(tokens) > 1 and tokens[-2] in OPTIONS:
+        option = OPTIONS[tokens[-2]]
+        if last not in option.choices:
+            return tuple(Hint(f'{option.name} {choice}', option.help)
+                         for choice in option.choices if choice.startswith(last))
+    return ()
+
+
+def quote(value: str) -> str:
+    """value as a single option value, whatever words it has"""
+    return f'{QUOTE}{value.replace(QUOTE, "")}{QUOTE}'
+
+
+def _value(tokens: Tuple[str, ...], i: int) -> Tuple[str, int]:
+    """The option value starting at tokens[i] and the index after it.
+
+    A quoted value runs to the word that closes the quote, or to the end
+    of the query while it is still being typed.
+    """
+    if not tokens[i].startswith(QUOTE):
+        return tokens[i], i + 1
+    end = i
+    while end < len(tokens) - 1 and not (
+            tokens[end].endswith(QUOTE) and (end > i or len(tokens[end]) > 1)):
+        end += 1
+    return ' '.join(tokens[i:end + 1]).strip(QUOTE), end + 1
+
+
+def with_option(input: str, name: str, value: object) -> str:
+    """The query with option name set to value, replacing any earlier value"""
+    tokens = input.split()
+    kept = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == name:
+            i += 2
+            continue
+        kept.append(tokens[i])
+        i += 1
+    return ' '.join(kept + [name, str(value)])
+
+
+@lru_cache(maxsize=256)
+def parse_query(input: str) -> Query:
+    """Splits a query into search words and :option values.
+
+    Invalid option values are treated as search words rather than errors,
+    and unknown :words are searched for as typed.
+    """
+    tokens = tuple(input.split())
+    words = []
+    values: Dict[str, object] = {}
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        option = OPTIONS.get(token)
+        i += 1
+        if option is None:
+            words.append(token)
+            continue
+        if i == len(tokens):
+            break
+        text, end = _value(tokens, i)
+        try:
+            value = option.convert(text)
+        except ValueError:
+            continue
+        if option.choices and value not in option.choices:
+            continue
+        values[option.name[1:]] = value
+        i = end
+    hints = _hints(tokens) if tokens else ()
+    if hints:
+        prefix = input.rstrip()
+        prefix = prefix[:len(prefix) - len(tokens[-1])]
+        if tokens[-1] not in OPTIONS and len(tokens) > 1 and tokens[-2] in OPTIONS:
+            prefix = prefix.rstrip()[:-len(tokens[-2])]
+        values['prefix'] = prefix
+    return Query(tuple(words), hints=hints, **values)
 
-if __name__ == "__main__":
-    args, actions = parse_args("test this :limit 10")
-    for item in actions:
-        print(item)
@@ -0,0 +1,101 @@
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cider_api import artwork
+from cider_api.media import PLAYABLE_KINDS, Media
+from parse_args import quote
+
+# Media whose serialized parts are kept between searches.
+MAX_ENTRIES = 2048
+ICON_SIZE = (32, 32)
+PREVIEW_SIZE = (512, 512)
+
+
+class Fragment(str):
+    """A result already serialized to JSON, written out as it is"""
+    __slots__ = ()
+
+
+class ResultRenderer:
+    """Serializes search results to Flow's JSON once per media.
+
+    A result is the item flox's add_item would build, but everything in
+    it that depends only on the media, its title, action and payload, is
+    serialized the first time the media is shown and cached. Showing it
+    again only adds the icon, preview, context and score around those
+    parts. Artwork is resolved every time, it may have been downloaded
+    to the artwork cache since.
+    """
+
+    def __init__(self, keyword: str, default_icon: str, max_entries: int = MAX_ENTRIES):
+        self.keyword = keyword
+        self.default_icon = default_icon
+        self.max_entries = max_entries
+        self._parts: "OrderedDict[Media, Tuple[str, str, str]]" = OrderedDict()
+
+    def _serialize(self, media: Media) -> Tuple[str, str, str]:
+        payload = json.dumps(media.to_payload())
+        if media.kind in PLAYABLE_KINDS:
+            subtitle = f"by {media.artist_name} ({media.kind})" \
+                if media.artist_name else media.kind.capitalize()
+            action = f'{{"method": "play_media", "parameters": [{payload}], ' \
+                     f'"dontHideAfterAction": false}}'
+        else:
+            # Picking an artist searches for their songs and albums.
+            subtitle = f"Search {media.kind}"
+            query = f"{self.keyword} :by {quote(media.name)} "
+            action = json.dumps({"method": "change_query", "parameters": [query, True],
+                                 "dontHideAfterAction": True})
+        head = json.dumps({"Title": media.name, "SubTitle": subtitle})[:-1]
+        tail = f'"JsonRPCAction": {action}, ' + json.dumps({
+            "AutoCompleteText": f"{self.keyword} {media.name}".replace("* ", "")})[1:-1]
+        return head, payload, tail
+
+    def parts(self, media: Media) -> Tuple[str, str, str]:
+        """The parts of the result's JSON object that don't change between
+        searches, its start and its last members, and the media's payload"""
+        parts = self._parts.get(media)
+        if parts is not None:
+            self._parts.move_to_end(media)
+            return parts
+        parts = self._parts[media] = self._serialize(media)
+        if len(self._parts) > self.max_entries:
+            self._parts.popitem(last=False)
+        return parts
+
+    def result(self, media: Media, score: int,
+               query: Optional[Sequence[Any]] = None) -> Fragment:
+        """media as a result. Playable media carry their payload as
+        context, followed by the query they were found with, if any."""
+        head, payload, tail = self.parts(media)
+        icon = media.artwork(*ICON_SIZE) if media.artwork_url else self.default_icon
+        preview = ""
+        if media.kind not in PLAYABLE_KINDS:
+            context = "null"
+        else:
+            context = f"[{payload}, {json.dumps(list(query))[1:]}" if query else f"[{payload}]"
+            preview = json.dumps(media.artwork(*PREVIEW_SIZE))
+            preview = f', "Preview": {{"PreviewImagePath": {preview}}}'
+        return Fragment(f'{head}, "IcoPath": {json.dumps(icon)}, "ContextData": {context}, '
+                        f'"Score": {int(score)}, {tail}{preview}}}')
+
+    def results(self, ranked: Iterable[Tuple[Media, int]],
+                query: Optional[Sequence[Any]] = None) -> List[Fragment]:
+        """Ranked media as results, looking their artwork up all at once"""
+        ranked = list(ranked)
+        artwork.preload((media.artwork_url for media, _ in ranked), (ICON_SIZE, PREVIEW_SIZE))
+        return [self.result(media, score, query) for media, score in ranked]
+
+
+def dumps(response: Dict[str, Any]) -> str:
+    """JSON of a response whose lists may hold fragments"""
+    parts = []
+    for key, value in response.items():
+        if isinstance(value, list):
+            items = ", ".join(item if isinstance(item, Fragment) else json.dumps(item)
+                              for item in value)
+            parts.append(f'"{key}": [{items}]')
+        else:
+            parts.append(f'"{key}": {json.dumps(value)}')
+    return "{" + ", ".join(parts) + "}"
@@ -1,13 +1,17 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING, Any, List
-import argparse
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-
-from parse_args import CHOICES
+from parse_args import Query
+from cider_api import tracing
 from cider_api.media import Media
 if TYPE_CHECKING:
     from main import FlowCider
 
+# How old a stored now playing item may be before it is fetched first.
+NOW_PLAYING_MAX_STALE = 30
+# Keeps now playing above the favourites listed with it.
+NOW_PLAYING_SCORE = 100000
+
 
 def exception_results(plugin: FlowCider, exception: Exception):
     if isinstance(exception, ConnectionRefusedError):
@@ -20,57 +24,105 @@ def exception_results(plugin: FlowCider, exception: Exception):
     raise exception
 
 
-def search_results(plugin: FlowCider, args: argparse.Namespace, results: List[Media]):
+def search_results(plugin: FlowCider, args: Query, results: List[Media],
+                   from_history: bool = False, next_query: Optional[str] = None):
     if not results:
         plugin.add_item(
             title="No results found"
         )
         return
-    if args.type in CHOICES:
-        results = [
-            result for result in results if result.kind == args.type]
-    if args.by:
-        results = [
-            result for result in results if result.artist_name.lower() == args.by.lower()]
-    for result in results:
+    term = args.term
+    with tracing.span("rank"):
+        ranked = plugin.ranker.rank(term, results)
+    with tracing.span("render"):
+        # Results from history can't be searched for again as a whole.
+        query = None if from_history else (term, args.limit, args.by)
+        plugin._results.extend(plugin.renderer.results(ranked, query))
+        if next_query is not None:
+            # Scores of ranked results start above 0, this stays last.
+            plugin.add_item(
+                title="More results",
+                subtitle=f"Show page {args.page + 1}",
+                method=plugin.change_query,
+                parameters=[f"{plugin.user_keyword} {next_query} ", True],
+                score=0,
+                dont_hide=True,
+            )
+    plugin.prefetch([result for result, _ in ranked])
+
+
+def hint_results(plugin: FlowCider, query: Query):
+    for hint in query.hints:
+        text = f"{query.prefix}{hint.text} "
         plugin.add_item(
-            title=result.name,
-            subtitle=f"by {result.artist_name} ({result.kind})",
-            icon=result.artwork(32, 32),
-            method=plugin.play_media,
-            parameters=[result._attributes],
-            context=[result._attributes],
-            Preview={
-                "PreviewImagePath": result.artwork(512, 512),
-            }
+            title=hint.text,
+            subtitle=hint.help,
+            method=plugin.change_query,
+            parameters=[f"{plugin.user_keyword} {text}", True],
+            auto_complete_text=f"{plugin.user_keyword} {text}",
+            dont_hide=True,
         )
 
 
-def argument_results(plugin: FlowCider, args: argparse.Namespace, actions: List[argparse.Action]):
-    if " ".join(args.query).endswith(":"):
-        for action in actions:
-            if action.option_strings:
-                plugin.add_item(
-                    title=action.option_strings[0],
-                    subtitle=action.help or "",
-                )
-        return
+def stats_results(plugin: FlowCider):
+    histograms = tracing.Tracer(plugin.trace_path).histograms()
+    for name, histogram in sorted(histograms.items(), key=lambda item: -item[1].total):
+        plugin.add_item(
+            title=name,
+            subtitle=" | ".join(
+                f"p{p} {histogram.percentile(p) * 1000:.1f}ms" for p in (50, 95, 99))
+            + f" | max {histogram.max * 1000:.1f}ms | {histogram.count} calls",
+        )
+    debounce = plugin.debouncer.stats()
+    plugin.add_item(
+        title="debounce",
+        subtitle=f"delay {debounce['delay'] * 1000:.0f}ms | "
+                 f"{debounce['executed']} searched | {debounce['cancelled']} skipped",
+    )
+    enabled = tracing.enabled()
+    plugin.add_item(
+        title="Stop tracing" if enabled else "Start tracing",
+        subtitle="Time each step of every request" if not enabled
+        else "Stop recording how long each step takes",
+        method=plugin.set_tracing,
+        parameters=[not enabled],
+    )
+    if histograms:
+        plugin.add_item(
+            title="Clear stats",
+            subtitle="Forget every recorded timing",
+            method=plugin.reset_stats,
+        )
 
 
-def now_playing(plugin: FlowCider):
-    media_status = plugin.cider.media_status()
+def now_playing(plugin: FlowCider, media_status: Optional[Dict] = None):
+    if media_status is None:
+        media_status = plugin.cider.media_status(max_stale=NOW_PLAYING_MAX_STALE)
     data = media_status.get("data")
     if data:
-        media = Media(data)
+        media = Media.from_attributes(data)
         plugin.add_item(
             title=str(media),
             subtitle="Now playing" if data.get("status") else "Paused",
             icon=media.artwork(32, 32),
             method=plugin.play_pause,
-            context=[data],
+            context=[media.to_payload()],
+            score=NOW_PLAYING_SCORE,
         )
 
 
+async def _context_statuses(plugin: FlowCider, media: Media) -> Tuple[Dict, Dict]:
+    # The pool's connections block on their reads, so both requests go out
+    # together on a connection of AsyncCider's own. Only a cache miss on
+    # the library status gets here, and both replies are recorded.
+    import asyncio
+    from cider_api.async_cider import AsyncCider
+    async with AsyncCider(plugin.cider.host, plugin.cider.port) as cider:
+        library_status, media_status = await asyncio.gather(
+            cider.library_status(media), cider.media_status())
+    return library_status, media_status
+
+
 def context_menu_results(plugin: FlowCider, data: List[Any]):
     if data:
         plugin.add_item(
@@ -85,8 +137,24 @@ def context_menu_results(plugin: FlowCider, data: List[Any]):
             method=plugin.play_media_last,
             parameters=[data[0]]
         )
-        media = Media(data[0])
-        library_status = plugin.cider.library_status(media)
+        media = Media.from_payload(data[0])
+        if len(data) >= 3:
+            term, limit, artist = data[1], data[2], data[3] if len(data) > 3 else None
+            plugin.add_item(
+                title=f"Play all {media.kind}s later",
+                subtitle=f"Add every {media.kind} from these results to the end of the queue",
+                method=plugin.play_all_later,
+                parameters=[term, limit, media.kind, artist]
+            )
+        library_status = plugin.cider.library_statuses.get(media)
+        media_status = None
+        if library_status is None:
+            # asyncio is only worth importing when Cider has to be asked.
+            import asyncio
+            library_status, media_status = asyncio.run(
+                _context_statuses(plugin, media))
+            plugin.cider.record_library_status(media, library_status)
+            plugin.cider.record_media_status(media_status)
         rating = library_status["data"]["rating"]
         if rating != 1:
             plugin.add_item(
@@ -123,4 +191,4 @@ def context_menu_results(plugin: FlowCider, data: List[Any]):
                 method=plugin.cider.toggle_library,
                 parameters=[data[0]]
             )
-        now_playing(plugin)
+        now_playing(plugin, media_status)
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# The plugin imports its modules from its own directory, as Flow runs it.
+sys.path.insert(0, str(ROOT / 'src' / 'plugin'))
+sys.path.insert(0, str(ROOT / 'bin'))
+
+from mock_cider import MockCider, MockCiderServer  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def mock_cider():
+    server = MockCiderServer(MockCider()).start()
+    yield server
+    server.stop()
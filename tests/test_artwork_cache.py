@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cider_api import artwork
+from cider_api.artwork_cache import ArtworkCache, HTTPPool
+
+IMAGES = {
+    '/a/32x32bb.jpg': b'a' * 1000,
+    '/b/32x32bb.jpg': b'b' * 1000,
+    '/c/32x32bb.jpg': b'c' * 1000,
+    # The same image under another URL.
+    '/copy-of-a.jpg': b'a' * 1000,
+}
+
+
+class ArtworkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), ArtworkHandler)
+        self.connections = 0
+        self.requests = []
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+
+class ArtworkHandler(BaseHTTPRequestHandler):
+    # Keeps connections open between requests, as Apple's CDN does.
+    protocol_version = 'HTTP/1.1'
+    server: ArtworkServer
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        data = IMAGES.get(self.path)
+        self.send_response(200 if data is not None else 404)
+        data = data if data is not None else b'not found'
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ArtworkServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ArtworkCache(str(tmp_path / 'artwork'))
+    yield cache
+    cache.pool.close()
+
+
+def images(cache: ArtworkCache):
+    return sorted(name for name in os.listdir(cache.path) if name.endswith('.jpg'))
+
+
+def test_connections_are_kept_alive(server):
+    pool = HTTPPool()
+    for path in ('/a/32x32bb.jpg', '/b/32x32bb.jpg', '/c/32x32bb.jpg'):
+        assert pool.get(server.url(path)) == IMAGES[path]
+    assert server.connections == 1
+    pool.close()
+
+
+def test_failed_download_raises(server):
+    pool = HTTPPool()
+    with pytest.raises(OSError):
+        pool.get(server.url('/missing.jpg'))
+    # The connection stays usable after an error status.
+    assert pool.get(server.url('/a/32x32bb.jpg')) == IMAGES['/a/32x32bb.jpg']
+    pool.close()
+
+
+def test_fetch_stores_and_reuses(server, cache):
+    url = server.url('/a/32x32bb.jpg')
+    path = cache.fetch(url)
+    with open(path, 'rb') as f:
+        assert f.read() == IMAGES['/a/32x32bb.jpg']
+    assert cache.fetch(url) == path
+    assert server.requests == ['/a/32x32bb.jpg']
+    assert ArtworkCache(cache.path).get(url) == path
+
+
+def test_same_image_is_stored_once(server, cache):
+    first = cache.fetch(server.url('/a/32x32bb.jpg'))
+    second = cache.fetch(server.url('/copy-of-a.jpg'))
+    assert first == second
+    assert len(images(cache)) == 1
+
+
+def test_least_recently_used_are_evicted(server, tmp_path):
+    cache = ArtworkCache(str(tmp_path / 'artwork'), max_bytes=2500)
+    a, b = server.url('/a/32x32bb.jpg'), server.url('/b/32x32bb.jpg')
+    old = time.time() - 60
+    for url in (a, b):
+        os.utime(cache.fetch(url), (old, old))
+    # Showing a marks it used once the next download runs.
+    assert cache.get(a) is not None
+    cache.fetch(server.url('/c/32x32bb.jpg'))
+    assert cache.evictions == 1
+    assert cache.get(a) is not None
+    assert cache.get(b) is None
+    assert ArtworkCache(cache.path).get(b) is None
+
+
+def test_fetch_many_maps_failures_to_none(server, cache):
+    good, bad = server.url('/a/32x32bb.jpg'), server.url('/missing.jpg')
+    paths = cache.fetch_many([good, bad, good])
+    assert paths[bad] is None
+    assert paths[good] == cache.get(good)
+    assert server.requests.count('/a/32x32bb.jpg') == 1
+
+
+def test_preload_answers_gets_from_memory(server, cache, monkeypatch):
+    cached, missing = server.url('/a/32x32bb.jpg'), server.url('/b/32x32bb.jpg')
+    cache.fetch(cached)
+    fresh = ArtworkCache(cache.path)
+    fresh.preload([cached, missing])
+
+    def query(key):
+        raise AssertionError(f'{key} looked up again')
+
+    monkeypatch.setattr(fresh._index, 'get', query)
+    assert fresh.get(cached) == cache.get(cached)
+    assert fresh.get(missing) is None
+
+
+def test_get_artwork_prefers_the_cache(server, cache):
+    template = server.url('/a/{w}x{h}bb.jpg')
+    artwork.use_cache(cache)
+    try:
+        assert artwork.get_artwork(template) == server.url('/a/32x32bb.jpg')
+        path = cache.fetch(server.url('/a/32x32bb.jpg'))
+        assert artwork.get_artwork(template) == path
+        assert artwork.get_artwork(template, 512, 512) == server.url('/a/512x512bb.jpg')
+    finally:
+        artwork.use_cache(None)
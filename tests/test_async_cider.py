@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from cider_api.async_cider import AsyncCider
+from mock_cider import MockCider, MockCiderServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_actions(mock_cider):
+    async def statuses():
+        async with AsyncCider('127.0.0.1', mock_cider.port) as cider:
+            return await asyncio.gather(cider.media_status(), cider.search('karma'))
+
+    media_status, results = run(statuses())
+    assert media_status['type'] == 'playbackStateUpdate'
+    assert [media.name for media in results] == ['Karma Police']
+
+
+def test_search_by_artist(mock_cider):
+    async def search():
+        async with AsyncCider('127.0.0.1', mock_cider.port) as cider:
+            return await cider.search('', types=('songs', 'albums'), artist='Daft Punk')
+
+    results = run(search())
+    assert results
+    assert {media.artist_name for media in results} == {'Daft Punk'}
+
+
+def test_reader_restarted_after_it_stops(mock_cider):
+    async def actions():
+        async with AsyncCider('127.0.0.1', mock_cider.port) as cider:
+            dispatch = cider._dispatch
+
+            def fail_once(response):
+                cider._dispatch = dispatch
+                raise ValueError('Unreadable frame')
+
+            cider._dispatch = fail_once
+            with pytest.raises(ConnectionError):
+                await cider.media_status()
+            return await cider.media_status()
+
+    assert run(actions())['type'] == 'playbackStateUpdate'
+
+
+def test_late_reply_is_not_handed_to_the_next_action():
+    server = MockCiderServer(MockCider(latency=300)).start()
+    server.mock.ratings.update(a=1, b=-1)
+
+    async def statuses():
+        async with AsyncCider('127.0.0.1', server.port) as cider:
+            with pytest.raises(TimeoutError):
+                await cider._action('library-status', 0.1, type='songs', id='a')
+            return await cider._action('library-status', 2, type='songs', id='b')
+
+    try:
+        assert run(statuses())['data']['rating'] == -1
+    finally:
+        server.stop()
+
+
+def test_failed_send_is_not_left_waiting(mock_cider, monkeypatch):
+    async def send_fails():
+        async with AsyncCider('127.0.0.1', mock_cider.port) as cider:
+            await cider.connect()
+
+            def send(payload):
+                raise ConnectionResetError('Connection reset')
+
+            monkeypatch.setattr(cider._ws, 'send', send)
+            with pytest.raises(ConnectionResetError):
+                await cider.media_status()
+            assert not any(cider._waiting.values())
+            return await cider.media_status()
+
+    assert run(send_fails())['type'] == 'playbackStateUpdate'
@@ -0,0 +1,95 @@
+import time
+
+from cider_api.cache import LibraryStatusCache, PageCache, SearchCache, SearchPage
+from cider_api.media import Media
+from cider_api.store import PersistentStore
+
+
+def song(id: str, name: str, artist: str = 'Radiohead') -> Media:
+    return Media(id, 'song', name, artist)
+
+
+SONGS = [song('1', 'Karma Police'), song('2', 'Paranoid Android'), song('3', 'Airbag'),
+         song('4', 'Get Lucky', 'Daft Punk')]
+
+
+def test_exact_hit():
+    cache = SearchCache()
+    cache.put('Radiohead', 20, SONGS[:3])
+    assert cache.get('  radiohead ', 20) == SONGS[:3]
+    assert cache.stats()['hits'] == 1
+
+
+def test_miss_on_other_categories_or_larger_limit():
+    cache = SearchCache()
+    cache.put('radiohead', 20, SONGS[:3], types=('songs',))
+    assert cache.get('radiohead', 20, ('albums',)) is None
+    assert cache.get('radiohead', 50, ('songs',)) is None
+    assert cache.stats()['misses'] == 2
+
+
+def test_prefix_hit_filters_complete_results():
+    cache = SearchCache()
+    cache.put('r', 20, SONGS, truncated=False)
+    assert cache.get('radiohead karma', 20) == [SONGS[0]]
+    assert cache.stats()['prefix_hits'] == 1
+
+
+def test_prefix_hit_uses_longest_prefix():
+    cache = SearchCache()
+    cache.put('r', 20, SONGS, truncated=False)
+    cache.put('radio', 20, SONGS[1:2], truncated=False)
+    assert cache.get('radiohead', 20) == [SONGS[1]]
+
+
+def test_prefix_hit_respects_limit():
+    cache = SearchCache()
+    cache.put('radiohead', 20, SONGS[:3], truncated=False)
+    assert cache.get('radiohead', 1) == [SONGS[0]]
+
+
+def test_truncated_results_answer_only_their_term():
+    cache = SearchCache()
+    cache.put('r', 20, SONGS, truncated=True)
+    assert cache.get('radiohead', 20) is None
+    assert cache.get('r', 20) == SONGS
+
+
+def test_expired_entries_are_dropped():
+    cache = SearchCache(ttl=0.01)
+    cache.put('radiohead', 20, SONGS, truncated=False)
+    time.sleep(0.02)
+    assert cache.get('radiohead', 20) is None
+    assert cache.get('radiohead karma', 20) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_bounded_by_results():
+    cache = SearchCache(max_results=5)
+    cache.put('a', 20, SONGS[:3])
+    cache.put('b', 20, SONGS[:3])
+    assert cache.get('a', 20) is None
+    assert cache.get('b', 20) == SONGS[:3]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_page_cache_keeps_pages_apart():
+    cache = PageCache()
+    first, second = SearchPage(SONGS[:2], 0, ('songs',)), SearchPage(SONGS[2:], 2, ())
+    cache.put('radiohead', 2, ('songs',), first)
+    cache.put('radiohead', 2, ('songs',), second)
+    assert cache.get('Radiohead', 2, ('songs',), 0) is first
+    assert cache.get('radiohead', 2, ('songs',), 2) is second
+    assert not second.more
+
+
+def test_library_status_shared_through_store(tmp_path):
+    store = PersistentStore(str(tmp_path / 'cache.sqlite3'))
+    status = {'type': 'libraryStatus', 'data': {'inLibrary': True, 'rating': 0}}
+    LibraryStatusCache(store=store).put(SONGS[0], status)
+    cache = LibraryStatusCache(store=store)
+    assert cache.get(SONGS[0]) == status
+    cache.update(SONGS[0], rating=1)
+    assert cache.get(SONGS[0])['data'] == {'inLibrary': True, 'rating': 1}
+    cache.invalidate(SONGS[0])
+    assert LibraryStatusCache(store=store).get(SONGS[0]) is None
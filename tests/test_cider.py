@@ -0,0 +1,216 @@
+import time
+
+import pytest
+
+from cider_api.cider import Cider
+from cider_api.media import Media
+from cider_api.store import PersistentStore
+from cider_api.web_sockets import ConnectionPool, WebSocket
+from mock_cider import MockCider, MockCiderServer
+
+AIRBAG = Media('1097862703', 'song', 'Airbag', 'Radiohead')
+# The item playing in the recorded playback state.
+KARMA = Media('1097862720', 'song', 'Karma Police', 'Radiohead')
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    # Categories of every search sent to Cider.
+    sent = []
+    action = Cider._action
+
+    def record(self, name, *args, **kwargs):
+        if name == 'search':
+            sent.append(kwargs['types'])
+        return action(self, name, *args, **kwargs)
+
+    monkeypatch.setattr(Cider, '_action', record)
+    return sent
+
+
+def test_pages_continue_categories_with_more(mock_cider, searches):
+    cider = Cider(port=mock_cider.port)
+    first = cider.search_page('radiohead', 5, ('songs', 'albums'), 0)
+    assert first.next == ('songs',)
+    second = cider.search_page('radiohead', 5, ('songs', 'albums'), 1)
+    assert {media.kind for media in second.results} == {'song'}
+    assert searches == ['songs,albums', 'songs']
+    cider.close()
+
+
+def test_next_page_after_restart_continues_stored_page(mock_cider, searches, tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    before = Cider(port=mock_cider.port, store=PersistentStore(path))
+    before.search_page('radiohead', 5, ('songs', 'albums'), 0)
+    before.close()
+    after = Cider(port=mock_cider.port, store=PersistentStore(path))
+    after.search_page('radiohead', 5, ('songs', 'albums'), 1)
+    assert searches == ['songs,albums', 'songs']
+    after.close()
+
+
+def test_search_pages_until_the_last(mock_cider):
+    cider = Cider(port=mock_cider.port)
+    pages = list(cider.search_pages('radiohead', 5, ('songs',)))
+    ids = [media.id for page in pages for media in page.results]
+    assert len(pages) > 2
+    assert len(ids) == len(set(ids)) == len(mock_cider.mock.search('radiohead', 100, 'songs')
+                                            ['songs']['data'])
+    assert not pages[-1].more
+    cider.close()
+
+
+def test_search_pages_stop_when_cider_ignores_the_offset(mock_cider, monkeypatch):
+    search = mock_cider.mock.search
+    monkeypatch.setattr(mock_cider.mock, 'search',
+                        lambda term, limit, types, offset=0: search(term, limit, types))
+    cider = Cider(port=mock_cider.port)
+    pages = list(cider.search_pages('radiohead', 5, ('songs',)))
+    assert [len(page.results) for page in pages] == [5, 0]
+    assert not pages[-1].more
+    cider.close()
+
+
+def test_page_without_the_artist_is_the_last(mock_cider):
+    cider = Cider(port=mock_cider.port)
+    # Both essentials playlists match, neither is by an artist of that name.
+    page = cider.search_page('', 1, ('playlists',), 0, artist='Essentials')
+    assert page.results == []
+    assert not page.more
+    cider.close()
+
+
+def test_search_by_artist(mock_cider):
+    cider = Cider(port=mock_cider.port)
+    results = cider.search('', 20, ('songs', 'albums'), artist='Daft Punk')
+    assert results
+    assert {media.artist_name for media in results} == {'Daft Punk'}
+    cider.close()
+
+
+def test_rating_updates_cached_status_before_reply(mock_cider):
+    cider = Cider(port=mock_cider.port)
+    assert cider.library_status(AIRBAG)['data']['rating'] == 0
+    cider.rate_media(AIRBAG, 'like')
+    requests = mock_cider.mock.requests
+    assert cider.library_status(AIRBAG)['data']['rating'] == 1
+    assert mock_cider.mock.requests == requests
+    assert mock_cider.mock.ratings[AIRBAG.id] == 1
+    cider.close()
+
+
+def test_failed_change_drops_cached_status(mock_cider, monkeypatch):
+    cider = Cider(port=mock_cider.port)
+    cider.library_status(AIRBAG)
+
+    def fail(*args):
+        raise ConnectionError('Cider went away')
+
+    monkeypatch.setattr(cider, '_library', fail)
+    with pytest.raises(ConnectionError):
+        cider.add_to_library(AIRBAG)
+    assert cider.library_statuses.get(AIRBAG) is None
+    assert not cider.library_status(AIRBAG)['data']['inLibrary']
+    cider.close()
+
+
+def test_playback_push_drops_status_of_playing_item():
+    server = MockCiderServer(MockCider(push_interval=0.05)).start()
+    cider = Cider(port=server.port)
+    try:
+        cider.library_status(KARMA)
+        cider.library_status(AIRBAG)
+        # Liked in Cider itself, the plugin only hears of it through a push.
+        server.mock.ratings[KARMA.id] = 1
+        cider.subscribe()
+        deadline = time.monotonic() + 5
+        while cider.library_statuses.get(KARMA) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cider.library_status(KARMA)['data']['rating'] == 1
+        assert cider.library_statuses.get(AIRBAG) is not None
+    finally:
+        cider.close()
+        server.stop()
+
+
+@pytest.fixture
+def sent(mock_cider, monkeypatch):
+    # Actions and ids in the order Cider received them.
+    received = []
+    reply = mock_cider.mock.reply
+
+    def record(message):
+        received.append((message['action'], message.get('id')))
+        return reply(message)
+
+    monkeypatch.setattr(mock_cider.mock, 'reply', record)
+    return received
+
+
+def test_batch_keeps_item_order(mock_cider, sent):
+    cider = Cider(port=mock_cider.port)
+    results = cider.play_later_many([AIRBAG, KARMA])
+    assert [result.media for result in results] == [AIRBAG, KARMA]
+    assert all(result.ok and result.response['type'] == 'generic' for result in results)
+    assert sent == [('play-later', AIRBAG.id), ('play-later', KARMA.id)]
+    cider.close()
+
+
+def test_play_next_many_queues_last_first(mock_cider, sent):
+    cider = Cider(port=mock_cider.port)
+    results = cider.play_next_many([AIRBAG, KARMA])
+    assert [result.media for result in results] == [AIRBAG, KARMA]
+    assert sent == [('play-next', KARMA.id), ('play-next', AIRBAG.id)]
+    cider.close()
+
+
+def test_batch_fails_items_after_a_failed_send(mock_cider, sent, monkeypatch):
+    submit = WebSocket.submit
+    calls = []
+
+    def fail_second(self, *args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise ConnectionResetError('Connection reset')
+        return submit(self, *args)
+
+    cider = Cider(port=mock_cider.port)
+    lucky = Media('617154402', 'song', 'Get Lucky', 'Daft Punk')
+    cider.library_status(KARMA)
+    monkeypatch.setattr(WebSocket, 'submit', fail_second)
+    results = cider.rate_many([AIRBAG, KARMA, lucky], 'like')
+    assert [result.ok for result in results] == [True, False, False]
+    assert isinstance(results[1].error, ConnectionResetError)
+    assert results[2].error is results[1].error
+    assert sent[-1] == ('rating', AIRBAG.id)
+    # The optimistic rating of items that failed is dropped.
+    assert cider.library_statuses.get(KARMA) is None
+    cider.close()
+
+
+def test_batch_without_a_connection(monkeypatch):
+    def checkout(self, timeout):
+        raise TimeoutError('No free connection')
+
+    monkeypatch.setattr(ConnectionPool, 'checkout', checkout)
+    cider = Cider(port=0)
+    results = cider.add_to_library_many([AIRBAG, KARMA])
+    assert [type(result.error) for result in results] == [TimeoutError, TimeoutError]
+    assert len(cider.library) == 0
+
+
+def test_batch_shares_one_timeout():
+    # Replies to one connection come one after another, 0.2 s apart.
+    server = MockCiderServer(MockCider(latency=200)).start()
+    cider = Cider(port=server.port)
+    try:
+        start = time.monotonic()
+        results = cider._batch('play-later', [
+            (media, {'id': media.id, 'type': media.kind}) for media in (AIRBAG, KARMA, AIRBAG)],
+            timeout=0.3)
+        assert time.monotonic() - start < 0.5
+        assert [result.ok for result in results] == [True, False, False]
+        assert isinstance(results[1].error, TimeoutError)
+    finally:
+        cider.close()
+        server.stop()
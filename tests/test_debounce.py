@@ -0,0 +1,52 @@
+import threading
+import time
+
+from debounce import Debouncer
+
+
+def test_pasted_query_waits_the_minimum(tmp_path):
+    debouncer = Debouncer(min_delay=0.01, max_delay=1, state_path=str(tmp_path / 'state.json'))
+    start = time.monotonic()
+    assert debouncer.wait('karma police')
+    assert time.monotonic() - start < 0.5
+    assert debouncer.stats()['executed'] == 1
+
+
+def test_newer_query_cancels_older(tmp_path):
+    path = str(tmp_path / 'state.json')
+    first, second = Debouncer(0.2, 0.2, state_path=path), Debouncer(0.2, 0.2, state_path=path)
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(first=first.wait('karma')))
+    thread.start()
+    time.sleep(0.05)
+    results['second'] = second.wait('karma police')
+    thread.join()
+    assert results == {'first': False, 'second': True}
+    assert second.stats()['cancelled'] == 1
+
+
+def test_processes_do_not_lose_updates(tmp_path):
+    # One debouncer per keystroke, as Flow runs one process for each.
+    path = str(tmp_path / 'state.json')
+    count = 40
+
+    def type_key(i):
+        Debouncer(0, 0, state_path=path).wait('x' * i)
+
+    threads = [threading.Thread(target=type_key, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    stats = Debouncer(state_path=path).stats()
+    assert stats['executed'] + stats['cancelled'] == count
+
+
+def test_superseded_by_queries_after_the_generation(tmp_path):
+    path = str(tmp_path / 'state.json')
+    # Shows history without waiting, as for an empty query.
+    shown = Debouncer(0, 0, state_path=path)
+    generation = shown.generation()
+    assert not shown.superseded(generation)
+    Debouncer(0, 0, state_path=path).wait('karma')
+    assert shown.superseded(generation)
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from cider_api import decoding
+from cider_api.cider import Cider
+
+KARMA = {
+    'id': '1097862720', 'type': 'songs',
+    'attributes': {'name': 'Karma Police', 'artistName': 'Radiohead',
+                   'playParams': {'id': '1097862720', 'kind': 'song'}},
+}
+RADIOHEAD = {'id': '657515', 'type': 'artists', 'attributes': {'name': 'Radiohead'}}
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def backend(request, monkeypatch):
+    if request.param == 'orjson':
+        if decoding.orjson is None:
+            pytest.skip('orjson is not installed')
+    else:
+        monkeypatch.setattr(decoding, 'orjson', None)
+    return request.param
+
+
+def frame(data: dict) -> bytes:
+    return json.dumps({'status': 0, 'message': 'ok', 'type': 'searchResults',
+                       'data': data}, ensure_ascii=False).encode()
+
+
+def search(monkeypatch, data: dict, types):
+    reply = frame(data)
+    monkeypatch.setattr(Cider, '_action', lambda self, action, **kwargs: decoding.loads(reply))
+    return Cider(port=0).search_page('radiohead', 5, types, 0)
+
+
+def test_str_and_bytes_decode_alike(backend):
+    message = {'type': 'searchResults', 'data': {'name': 'Sigur Rós', 'rating': -1}}
+    text = json.dumps(message, ensure_ascii=False)
+    assert decoding.loads(text) == decoding.loads(text.encode()) == message
+
+
+def test_search_reply(backend, monkeypatch):
+    page = search(monkeypatch, {'songs': {'data': [KARMA], 'next': '/search?offset=5'},
+                                'artists': {'data': [RADIOHEAD]}}, ('songs', 'artists'))
+    assert [(media.kind, media.name) for media in page.results] == [
+        ('song', 'Karma Police'), ('artist', 'Radiohead')]
+    assert page.next == ('songs',)
+
+
+def test_missing_and_empty_categories(backend, monkeypatch):
+    # Cider leaves out categories without matches, or sends them empty.
+    page = search(monkeypatch, {'songs': {'data': [KARMA]}, 'albums': {'data': []},
+                                'meta': {'results': {'order': ['songs']}}},
+                  ('songs', 'albums', 'playlists'))
+    assert [media.name for media in page.results] == ['Karma Police']
+    assert page.next == ()
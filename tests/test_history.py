@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from cider_api import history
+from cider_api.history import PlayHistory
+from cider_api.media import Media
+
+KARMA = Media('1', 'song', 'Karma Police', 'Radiohead')
+AIRBAG = Media('2', 'song', 'Airbag', 'Radiohead')
+LUCKY = Media('3', 'song', 'Get Lucky', 'Daft Punk')
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(history.time, 'time', lambda: now[0])
+    return now
+
+
+def lines(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_uses_add_up(tmp_path, clock):
+    plays = PlayHistory(str(tmp_path / 'history.jsonl'))
+    plays.record(KARMA, 'play')
+    plays.record(KARMA, 'like')
+    assert plays.score(KARMA) == pytest.approx(1.8)
+    assert plays.score(AIRBAG) == 0
+    assert plays.last_played(KARMA) == clock[0]
+    assert plays.last_played(AIRBAG) is None
+
+
+def test_score_halves_every_half_life(tmp_path, clock):
+    plays = PlayHistory(str(tmp_path / 'history.jsonl'), half_life=DAY)
+    plays.record(KARMA, 'play')
+    clock[0] += DAY
+    assert plays.score(KARMA) == pytest.approx(0.5)
+    clock[0] += 2 * DAY
+    assert plays.score(KARMA) == pytest.approx(0.125)
+
+
+def test_recent_use_outranks_older_frequent_use(tmp_path, clock):
+    plays = PlayHistory(str(tmp_path / 'history.jsonl'), half_life=DAY)
+    plays.record_many([AIRBAG, AIRBAG, AIRBAG], 'play')
+    clock[0] += 3 * DAY
+    plays.record(KARMA, 'play')
+    plays.record(LUCKY, 'dislike')
+    assert plays.top() == [KARMA, AIRBAG]
+    assert plays.top(term='airb') == [AIRBAG]
+
+
+def test_unknown_event():
+    with pytest.raises(ValueError):
+        PlayHistory('unused').record(KARMA, 'skip')
+
+
+def test_read_back_by_another_instance(tmp_path, clock):
+    path = tmp_path / 'history.jsonl'
+    PlayHistory(str(path)).record_many([KARMA, AIRBAG], 'play')
+    with open(path, 'a') as f:
+        f.write('{"time": 1, "event"')
+    plays = PlayHistory(str(path))
+    assert plays.top() == [KARMA, AIRBAG]
+
+
+def test_compaction_keeps_one_line_per_item(tmp_path, clock, monkeypatch):
+    path = tmp_path / 'history.jsonl'
+    plays = PlayHistory(str(path), half_life=DAY)
+    for _ in range(10):
+        plays.record(KARMA, 'play')
+    plays.record(AIRBAG, 'like')
+    clock[0] += DAY
+    monkeypatch.setattr(history, 'COMPACT_MARGIN', 0)
+    compacted = PlayHistory(str(path), half_life=DAY)
+    assert compacted.score(KARMA) == pytest.approx(5)
+    assert [line['media'][0] for line in lines(path)] == ['1', '2']
+    assert compacted.last_played(KARMA) == clock[0] - DAY
+
+
+def test_compaction_drops_decayed_items(tmp_path, clock, monkeypatch):
+    path = tmp_path / 'history.jsonl'
+    plays = PlayHistory(str(path), half_life=DAY)
+    for _ in range(10):
+        plays.record(AIRBAG, 'like')
+    plays.record(KARMA, 'play')
+    clock[0] += 30 * DAY
+    monkeypatch.setattr(history, 'COMPACT_MARGIN', 0)
+    compacted = PlayHistory(str(path), half_life=DAY)
+    compacted.top()
+    # Played items are kept for their play time, liked ones decay away.
+    assert [line['media'][0] for line in lines(path)] == ['1']
+
+
+def test_compaction_keeps_uses_recorded_meanwhile(tmp_path, clock, monkeypatch):
+    path = tmp_path / 'history.jsonl'
+    recorded = PlayHistory(str(path))
+    for _ in range(10):
+        recorded.record(KARMA, 'play')
+    monkeypatch.setattr(history, 'COMPACT_MARGIN', 0)
+    plays = PlayHistory(str(path))
+    read = plays._read
+
+    def read_then_another_process_records():
+        items = read()
+        if not hasattr(plays, 'appended'):
+            plays.appended = True
+            PlayHistory(str(path)).record(LUCKY, 'like')
+        return items
+
+    monkeypatch.setattr(plays, '_read', read_then_another_process_records)
+    assert plays.top() == [KARMA, LUCKY]
+    assert [line['media'][0] for line in lines(path)] == ['1', '3']
+
+
+def test_long_lived_instance_compacts_when_recording(tmp_path, clock, monkeypatch):
+    # As in the resident host, which reads the log only once.
+    monkeypatch.setattr(history, 'COMPACT_MARGIN', 0)
+    path = tmp_path / 'history.jsonl'
+    plays = PlayHistory(str(path))
+    for _ in range(10):
+        plays.record(KARMA, 'play')
+    assert len(lines(path)) <= history.COMPACT_RATIO
+    assert plays.score(KARMA) == pytest.approx(10)
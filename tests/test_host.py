@@ -0,0 +1,204 @@
+import functools
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import host
+
+# Stands in for the root logger flox adds a file handler to.
+flox_logger = logging.getLogger('flox-root')
+
+
+class FakeCider:
+    def subscribe(self):
+        pass
+
+
+class FakePlugin:
+    """Answers queries with one result titled after the query"""
+
+    hosted = False
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.settings_path = os.path.join(data_dir, 'Settings.json')
+        self.settings = {}
+        self.cider = FakeCider()
+        self.compactions = 0
+
+    def answer(self, request: str) -> str:
+        request = json.loads(request)
+        if request['method'] != 'query':
+            return ''
+        query = request['parameters'][0]
+        if query == 'fail':
+            raise RuntimeError('Cider is gone')
+        if query == 'silent':
+            return ''
+        return json.dumps({'result': [{'Title': query}]})
+
+    @functools.cached_property
+    def logger(self):
+        flox_logger.addHandler(logging.NullHandler())
+        flox_logger.setLevel(logging.WARNING)
+        return flox_logger
+
+    def compact(self):
+        self.compactions += 1
+
+    def close(self):
+        pass
+
+
+def query(text: str) -> str:
+    return json.dumps({'method': 'query', 'parameters': [text]})
+
+
+@pytest.fixture
+def plugin_dirs(tmp_path, monkeypatch):
+    flow = tmp_path / 'FlowLauncher'
+    plugindir = flow / 'Plugins' / 'FlowCider-1.0.0'
+    plugindir.mkdir(parents=True)
+    (plugindir / host.PLUGIN_MANIFEST).write_text(json.dumps(
+        {'Name': 'Flow Cider', 'Version': '1.0.0', 'IcoPath': 'icon.png'}))
+    data_dir = flow / 'Settings' / 'Plugins' / 'Flow Cider'
+    data_dir.mkdir(parents=True)
+    (data_dir / 'Settings.json').write_text(json.dumps({'resident': True}))
+    monkeypatch.chdir(plugindir)
+    started = []
+    monkeypatch.setattr(host, '_start_host', started.append)
+    return plugindir, data_dir, started
+
+
+@pytest.fixture
+def running_host(plugin_dirs):
+    _, data_dir, _ = plugin_dirs
+    thread = threading.Thread(target=host.serve, kwargs={
+        'idle_timeout': 30, 'factory': lambda: FakePlugin(str(data_dir))}, daemon=True)
+    thread.start()
+    address = data_dir / host.ADDRESS_FILE
+    deadline = time.monotonic() + 5
+    while not address.exists():
+        assert time.monotonic() < deadline, 'host did not start'
+        time.sleep(0.01)
+    yield thread
+    if thread.is_alive():
+        sock = socket.create_connection(('127.0.0.1', json.loads(address.read_text())['port']))
+        host._send(sock, json.loads(address.read_text()), None)
+        thread.join(5)
+
+
+def forwarded(capsysbinary, request: str):
+    answered = host.forward([request])
+    return answered, capsysbinary.readouterr().out
+
+
+def test_forward_answers_through_host(running_host, capsysbinary):
+    answered, out = forwarded(capsysbinary, query('radiohead'))
+    assert answered
+    assert json.loads(out) == {'result': [{'Title': 'radiohead'}]}
+
+
+def test_forward_without_host_starts_one(plugin_dirs, capsysbinary):
+    _, data_dir, started = plugin_dirs
+    assert forwarded(capsysbinary, query('radiohead')) == (False, b'')
+    assert started == [str(data_dir)]
+
+
+def test_forward_when_not_resident(plugin_dirs, capsysbinary):
+    _, data_dir, started = plugin_dirs
+    (data_dir / 'Settings.json').write_text('{}')
+    assert forwarded(capsysbinary, query('radiohead')) == (False, b'')
+    assert started == []
+
+
+def test_failed_query_is_answered_with_an_error(running_host, capsysbinary):
+    answered, out = forwarded(capsysbinary, query('fail'))
+    assert answered
+    [result] = json.loads(out)['result']
+    assert result['Title'] == 'RuntimeError'
+    assert result['SubTitle'] == 'Cider is gone'
+
+
+def test_empty_reply_to_query_falls_back(running_host, capsysbinary):
+    assert forwarded(capsysbinary, query('silent')) == (False, b'')
+
+
+def test_empty_reply_to_action_is_an_answer(running_host, capsysbinary):
+    request = json.dumps({'method': 'play_media', 'parameters': [{}]})
+    assert forwarded(capsysbinary, request) == (True, b'')
+
+
+def test_host_of_another_version_is_replaced(plugin_dirs, running_host, capsysbinary):
+    plugindir, data_dir, started = plugin_dirs
+    (plugindir / host.PLUGIN_MANIFEST).write_text(json.dumps(
+        {'Name': 'Flow Cider', 'Version': '1.1.0'}))
+    assert forwarded(capsysbinary, query('radiohead')) == (False, b'')
+    assert started == [str(data_dir)]
+    running_host.join(5)
+    assert not running_host.is_alive()
+    assert not (data_dir / host.ADDRESS_FILE).exists()
+
+
+def test_compacted_once_per_idle_stretch(plugin_dirs, capsysbinary):
+    _, data_dir, _ = plugin_dirs
+    plugin = FakePlugin(str(data_dir))
+    thread = threading.Thread(target=host.serve, kwargs={
+        'idle_timeout': 30, 'factory': lambda: plugin, 'compact_after': 0.05}, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while plugin.compactions < 1:
+            assert time.monotonic() < deadline, 'not compacted'
+            time.sleep(0.01)
+        time.sleep(0.2)
+        assert plugin.compactions == 1
+        assert forwarded(capsysbinary, query('radiohead'))[0]
+        while plugin.compactions < 2:
+            assert time.monotonic() < deadline, 'not compacted after the request'
+            time.sleep(0.01)
+    finally:
+        address = json.loads((data_dir / host.ADDRESS_FILE).read_text())
+        host._send(socket.create_connection(('127.0.0.1', address['port'])), address, None)
+        thread.join(5)
+
+
+def test_rebuilt_plugin_keeps_the_logger(tmp_path):
+    settings = tmp_path / 'Settings.json'
+    settings.write_text('{}')
+    handlers = len(flox_logger.handlers)
+    plugin_host = host.PluginHost(lambda: FakePlugin(str(tmp_path)))
+    first = plugin_host.current()
+    first.logger.setLevel(logging.DEBUG)
+    os.utime(settings, (0, 0))
+    second = plugin_host.current()
+    assert second is not first
+    assert second.logger is first.logger
+    assert len(flox_logger.handlers) == handlers + 1
+    # Like a plugin of its own, the rebuilt one only logs warnings until told otherwise.
+    assert flox_logger.level == logging.WARNING
+
+
+def test_latest_query_wins():
+    plugin = FakePlugin('.')
+    plugin_host = host.PluginHost(lambda: plugin)
+    plugin_host._lock.acquire()
+    replies = {}
+
+    def answer(text):
+        replies[text] = plugin_host.answer(query(text))
+
+    threads = [threading.Thread(target=answer, args=(text,)) for text in ('r', 'ra')]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    plugin_host._lock.release()
+    for thread in threads:
+        thread.join()
+    assert json.loads(replies['r']) == {'result': []}
+    assert json.loads(replies['ra']) == {'result': [{'Title': 'ra'}]}
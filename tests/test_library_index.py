@@ -0,0 +1,80 @@
+from cider_api.library_index import LibraryIndex, merge, tokenize
+from cider_api.media import Media
+from cider_api.store import PersistentStore
+
+ITEMS = [
+    Media('1', 'song', 'Karma Police', 'Radiohead', album_name='OK Computer',
+          genre_names=('Alternative',)),
+    Media('2', 'song', 'Paranoid Android', 'Radiohead', album_name='OK Computer'),
+    Media('3', 'album', 'OK Computer', 'Radiohead'),
+    Media('4', 'song', 'Get Lucky', 'Daft Punk', album_name='Random Access Memories'),
+]
+
+
+def index(store=None) -> LibraryIndex:
+    library = LibraryIndex(store)
+    for media in ITEMS:
+        library.add(media)
+    return library
+
+
+def ids(results):
+    return [media.id for media in results]
+
+
+def test_tokenize():
+    assert tokenize("Don't Stop - Remastered") == ['don', 't', 'stop', 'remastered']
+
+
+def test_every_word_must_match():
+    assert ids(index().search('radiohead karma')) == ['1']
+    assert index().search('radiohead lucky') == []
+
+
+def test_prefix_matches():
+    assert set(ids(index().search('comp'))) == {'1', '2', '3'}
+
+
+def test_exact_match_ranks_first():
+    library = LibraryIndex()
+    library.add(Media('1', 'song', 'Creeping Death', 'Metallica'))
+    library.add(Media('2', 'song', 'Creep', 'Radiohead'))
+    assert ids(library.search('creep')) == ['2', '1']
+
+
+def test_fuzzy_match_for_longer_words():
+    assert ids(index().search('radiohed karma')) == ['1']
+    # Words this short would match too much.
+    assert index().search('kam') == []
+
+
+def test_genres_are_indexed():
+    assert ids(index().search('alternative')) == ['1']
+
+
+def test_limit_applies_per_kind():
+    results = index().search('radiohead', limit=1)
+    assert sorted(media.kind for media in results) == ['album', 'song']
+
+
+def test_update_and_remove():
+    library = index()
+    library.add(Media('4', 'song', 'Instant Crush', 'Daft Punk'))
+    assert library.search('lucky') == []
+    assert ids(library.search('crush')) == ['4']
+    library.remove('4')
+    assert '4' not in library
+    assert library.search('daft') == []
+    assert len(library) == 3
+
+
+def test_persisted_between_instances(tmp_path):
+    store = PersistentStore(str(tmp_path / 'library.sqlite3'), expire=float('inf'))
+    index(store).remove('2')
+    library = LibraryIndex(PersistentStore(store.path, expire=float('inf')))
+    assert len(library) == 3
+    assert library.search('karma') == [ITEMS[0]]
+
+
+def test_merge_keeps_local_first_without_duplicates():
+    assert ids(merge(ITEMS[:2], [ITEMS[1], ITEMS[3]])) == ['1', '2', '4']
@@ -0,0 +1,87 @@
+from parse_args import DEFAULT_LIMIT, Query, parse_query, quote, with_option
+
+
+def test_plain_words():
+    query = parse_query('karma  police')
+    assert query.words == ('karma', 'police')
+    assert query.term == 'karma police'
+    assert query.limit == DEFAULT_LIMIT
+    assert query.by is None and query.type is None and query.page == 1
+
+
+def test_options_anywhere():
+    query = parse_query('ok :limit 5 computer :type albums :page 2')
+    assert query.term == 'ok computer'
+    assert (query.limit, query.type, query.page) == (5, 'albums', 2)
+
+
+def test_by_single_word():
+    query = parse_query('airbag :by radiohead')
+    assert query.term == 'airbag'
+    assert query.by == 'radiohead'
+
+
+def test_by_quoted_artist():
+    query = parse_query(':by "Daft Punk" get lucky')
+    assert query.by == 'Daft Punk'
+    assert query.term == 'get lucky'
+
+
+def test_by_artist_picked_from_results():
+    # What picking an artist result puts in the query box.
+    query = parse_query(f':by {quote("Daft Punk")} ')
+    assert query.by == 'Daft Punk'
+    assert query.term == ''
+
+
+def test_by_quote_still_being_typed():
+    query = parse_query('lucky :by "Daft Pu')
+    assert query.by == 'Daft Pu'
+    assert query.term == 'lucky'
+
+
+def test_quote_drops_quotes_in_value():
+    artist = quote('"Weird Al" Yankovic')
+    assert parse_query(f':by {artist}').by == 'Weird Al Yankovic'
+
+
+def test_invalid_values_are_skipped():
+    query = parse_query('airbag :limit abc :limit 0 :type songz')
+    assert query.limit == DEFAULT_LIMIT
+    assert query.type is None
+    assert query.term == 'airbag abc 0 songz'
+
+
+def test_unknown_option_is_searched_for():
+    assert parse_query('airbag :live').words == ('airbag', ':live')
+
+
+def test_option_without_value():
+    query = parse_query('airbag :limit')
+    assert query.term == 'airbag'
+    assert query.limit == DEFAULT_LIMIT
+
+
+def test_hints_for_partial_option():
+    query = parse_query('airbag :ty')
+    assert [hint.text for hint in query.hints] == [':type']
+    assert query.prefix == 'airbag '
+
+
+def test_hints_for_partial_choice():
+    query = parse_query('airbag :type al')
+    assert [hint.text for hint in query.hints] == [':type albums']
+    assert query.prefix == 'airbag '
+
+
+def test_complete_choice_has_no_hints():
+    assert parse_query('airbag :type albums').hints == ()
+
+
+def test_empty():
+    assert parse_query('') == Query()
+
+
+def test_with_option_replaces_value():
+    assert with_option('airbag :page 2 :limit 5', ':page', 3) == 'airbag :limit 5 :page 3'
+    assert with_option('airbag', ':page', 2) == 'airbag :page 2'
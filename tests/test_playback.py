@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from cider_api.cider import NOW_PLAYING_KEY, Cider
+from cider_api.playback import PlaybackListener
+from cider_api.store import PersistentStore
+from mock_cider import MockCider, MockCiderServer
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def pushing():
+    server = MockCiderServer(MockCider(push_interval=0.05)).start()
+    yield server
+    server.stop()
+
+
+def test_snapshot_follows_pushes(pushing):
+    listener = PlaybackListener('127.0.0.1', pushing.port, max_age=1)
+    listener.start()
+    try:
+        assert wait_for(lambda: listener.get() is not None)
+        assert listener.get()['data']['name'] == 'Karma Police'
+        pushing.mock.playback = {**pushing.mock.playback, 'name': 'Airbag'}
+        assert wait_for(lambda: listener.get()['data']['name'] == 'Airbag')
+        listener.invalidate()
+        assert listener.stale
+    finally:
+        listener.stop()
+    assert not listener.running
+
+
+def test_reconnects_once_cider_is_back():
+    gone = MockCiderServer(MockCider())
+    port = gone.port
+    gone.server_close()
+    listener = PlaybackListener('127.0.0.1', port, backoff=0.02, max_backoff=0.05)
+    listener.start()
+    try:
+        time.sleep(0.1)
+        assert listener.get() is None
+        server = MockCiderServer(MockCider(push_interval=0.05), port=port).start()
+        try:
+            assert wait_for(lambda: listener.get() is not None)
+        finally:
+            server.stop()
+    finally:
+        listener.stop()
+
+
+def test_subscribed_status_needs_no_round_trip(pushing):
+    cider = Cider(port=pushing.port)
+    try:
+        cider.subscribe()
+        assert wait_for(lambda: cider.playback.get() is not None)
+        requests = pushing.mock.requests
+        assert cider.media_status()['data']['name'] == 'Karma Police'
+        assert pushing.mock.requests == requests
+    finally:
+        cider.close()
+
+
+def test_stale_status_returned_while_refreshing(mock_cider, tmp_path):
+    store = PersistentStore(str(tmp_path / 'store.sqlite3'))
+    cider = Cider(port=mock_cider.port, store=store)
+    playing = mock_cider.mock.playback
+    try:
+        cider.media_status()
+        mock_cider.mock.playback = {**playing, 'name': 'Airbag'}
+        assert cider.media_status(max_stale=60)['data']['name'] == 'Karma Police'
+        # The stored status is brought up to date in the background.
+        assert wait_for(lambda: store.get(NOW_PLAYING_KEY)[0]['data']['name'] == 'Airbag')
+        assert cider.media_status(max_stale=60)['data']['name'] == 'Airbag'
+    finally:
+        mock_cider.mock.playback = playing
+        cider.close()
+
+
+def test_status_older_than_max_stale_is_fetched(mock_cider, tmp_path):
+    store = PersistentStore(str(tmp_path / 'store.sqlite3'))
+    cider = Cider(port=mock_cider.port, store=store)
+    try:
+        store.put(NOW_PLAYING_KEY, {'type': 'playbackStateUpdate', 'data': {'name': 'Airbag'}})
+        store.db.execute('UPDATE entries SET updated = updated - 120')
+        assert cider.media_status(max_stale=60)['data']['name'] == 'Karma Police'
+    finally:
+        cider.close()
@@ -0,0 +1,50 @@
+import time
+
+from cider_api.media import Media
+from cider_api.ranking import SCORE_STEP, Ranker
+
+KARMA = Media('1', 'song', 'Karma Police', 'Radiohead')
+KARMA_LIVE = Media('2', 'song', 'Karma Police (Live)', 'Radiohead')
+AIRBAG = Media('3', 'song', 'Airbag', 'Radiohead')
+KARMA_COVER = Media('4', 'song', 'Karma Police', 'Cover Band')
+
+
+def names(ranked) -> list:
+    return [media.name for media, _ in ranked]
+
+
+def test_better_matches_first():
+    ranked = Ranker().rank('karma police', [AIRBAG, KARMA_LIVE, KARMA])
+    assert names(ranked) == ['Karma Police', 'Karma Police (Live)', 'Airbag']
+
+
+def test_scores_keep_the_order():
+    ranked = Ranker().rank('karma', [AIRBAG, KARMA, KARMA_LIVE])
+    scores = [score for _, score in ranked]
+    assert scores == [3 * SCORE_STEP, 2 * SCORE_STEP, SCORE_STEP]
+
+
+def test_ties_keep_ciders_order():
+    # Same name and kind, so only their position in Cider's list differs.
+    ranker = Ranker(weights={'name': 1.0})
+    assert [media for media, _ in ranker.rank('karma', [KARMA_COVER, KARMA])] == \
+        [KARMA_COVER, KARMA]
+    assert [media for media, _ in ranker.rank('karma', [KARMA, KARMA_COVER])] == \
+        [KARMA, KARMA_COVER]
+
+
+def test_library_and_plays_break_ties():
+    played = {KARMA_COVER.id: time.time() - 60}
+    assert Ranker(library={KARMA.id}).rank('karma police', [KARMA_COVER, KARMA])[0][0] == KARMA
+    assert Ranker(played=lambda media: played.get(media.id)).rank(
+        'karma police', [KARMA, KARMA_COVER])[0][0] == KARMA_COVER
+
+
+def test_frecency_lifts_a_weaker_match():
+    ranker = Ranker(frecency=lambda media: 50.0 if media is AIRBAG else 0.0,
+                    weights={'prefix': 1.0, 'frecency': 2.0})
+    assert names(ranker.rank('karma', [KARMA, AIRBAG])) == ['Airbag', 'Karma Police']
+
+
+def test_no_candidates():
+    assert Ranker().rank('karma', []) == []
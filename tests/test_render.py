@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from cider_api import artwork
+from cider_api.artwork_cache import ArtworkCache
+from cider_api.media import Media
+from render import ResultRenderer, dumps
+
+ARTWORK = 'https://example.com/karma/{w}x{h}bb.jpg'
+KARMA = Media('1', 'song', 'Karma Police', 'Radiohead', ARTWORK)
+RADIOHEAD = Media('2', 'artist', 'Radiohead', '')
+QUERY = ('karma', 20, None)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ArtworkCache(str(tmp_path / 'artwork'))
+    monkeypatch.setattr(cache.pool, 'get', lambda url, timeout=None: url.encode())
+    artwork.use_cache(cache)
+    yield cache
+    artwork.use_cache(None)
+
+
+def render(renderer, ranked, query=QUERY) -> list:
+    return json.loads(dumps({'result': renderer.results(ranked, query)}))['result']
+
+
+def test_playable_result():
+    [result] = render(ResultRenderer('fc', 'icon.png'), [(KARMA, 10)])
+    assert result == {
+        'Title': 'Karma Police',
+        'SubTitle': 'by Radiohead (song)',
+        'IcoPath': 'https://example.com/karma/32x32bb.jpg',
+        'ContextData': [KARMA.to_payload(), *QUERY],
+        'Score': 10,
+        'JsonRPCAction': {'method': 'play_media', 'parameters': [KARMA.to_payload()],
+                          'dontHideAfterAction': False},
+        'AutoCompleteText': 'fc Karma Police',
+        'Preview': {'PreviewImagePath': 'https://example.com/karma/512x512bb.jpg'},
+    }
+
+
+def test_artist_result_searches_by_artist():
+    [result] = render(ResultRenderer('fc', 'icon.png'), [(RADIOHEAD, 5)], None)
+    assert result['IcoPath'] == 'icon.png'
+    assert result['ContextData'] is None
+    assert result['JsonRPCAction']['parameters'] == ['fc :by "Radiohead" ', True]
+    assert 'Preview' not in result
+
+
+def test_artwork_downloaded_later_is_shown(cache):
+    renderer = ResultRenderer('fc', 'icon.png')
+    [before] = render(renderer, [(KARMA, 10)])
+    assert before['IcoPath'] == 'https://example.com/karma/32x32bb.jpg'
+    icon = cache.fetch('https://example.com/karma/32x32bb.jpg')
+    [after] = render(renderer, [(KARMA, 10)])
+    assert after['IcoPath'] == icon
+    assert after['Preview'] == before['Preview']
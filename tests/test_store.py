@@ -0,0 +1,52 @@
+import os
+
+from cider_api.store import PersistentStore
+
+
+def test_get_many(tmp_path):
+    store = PersistentStore(str(tmp_path / 'store.sqlite3'))
+    store.put('a', [1])
+    store.put('b', {'x': 2})
+    found = store.get_many(['a', 'b', 'missing'])
+    assert {key: value for key, (value, _) in found.items()} == {'a': [1], 'b': {'x': 2}}
+    assert store.get_many([]) == {}
+
+
+def expire_all(store: PersistentStore) -> None:
+    store.db.execute('UPDATE entries SET updated = 0')
+
+
+def test_expired_entries_are_not_read(tmp_path):
+    store = PersistentStore(str(tmp_path / 'store.sqlite3'))
+    store.put('old', 1)
+    store.put('prefix:old', 2)
+    expire_all(store)
+    store.put('new', 3)
+    assert store.get('old') is None
+    assert store.get_many(['old', 'new']).keys() == {'new'}
+    assert list(store.items('prefix:')) == []
+    # Only compact() deletes them.
+    assert store.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0] == 3
+
+
+def test_never_expiring_store(tmp_path):
+    store = PersistentStore(str(tmp_path / 'store.sqlite3'), expire=float('inf'))
+    store.put('old', 1)
+    expire_all(store)
+    store.compact()
+    assert store.get('old')[0] == 1
+
+
+def test_compact_reclaims_expired_entries(tmp_path):
+    path = tmp_path / 'store.sqlite3'
+    store = PersistentStore(str(path))
+    for i in range(1000):
+        store.put(f'key-{i}', 'x' * 100)
+    expire_all(store)
+    store.put('new', 1)
+    store.close()
+    full = os.path.getsize(path)
+    store = PersistentStore(str(path))
+    store.compact()
+    assert store.db.execute('SELECT key FROM entries').fetchall() == [('new',)]
+    assert os.path.getsize(path) < full / 4
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from cider_api import tracing
+from cider_api.tracing import NO_SPAN, Histogram, Tracer
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(50) == 0
+    assert histogram.mean == 0
+
+
+def test_bucket_of_a_duration():
+    histogram = Histogram()
+    histogram.add(0.001)
+    histogram.add(1e-7)
+    # 1 ms is just under 2 ** 10 us, in the last quarter octave below it.
+    assert histogram.buckets == {39: 1, 0: 1}
+    assert histogram.max == 0.001
+
+
+def test_percentiles_within_a_bucket():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.add(ms / 1000)
+    assert histogram.count == 100
+    assert histogram.mean == pytest.approx(0.0505)
+    for p in (50, 90, 99):
+        assert p / 1000 <= histogram.percentile(p) <= p / 1000 * 2 ** (1 / 4)
+    # Never past the longest duration seen.
+    assert histogram.percentile(100) == histogram.max == 0.1
+
+
+def test_nested_spans(tmp_path):
+    tracer = Tracer(str(tmp_path / 'spans.jsonl'))
+    with tracer.span('query'):
+        with tracer.span('search'):
+            time.sleep(0.01)
+        with tracer.span('render'):
+            pass
+    # Inner spans end, and are recorded, before the one around them.
+    assert [name for name, _ in tracer._buffer] == ['search', 'render', 'query']
+    histograms = tracer.histograms()
+    assert histograms['search'].max >= 0.01
+    assert histograms['query'].max >= histograms['search'].max + histograms['render'].max
+
+
+def test_spans_read_back_from_both_logs(tmp_path):
+    tracer = Tracer(str(tmp_path / 'spans.jsonl'), max_bytes=10, flush_every=2)
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        tracer.record('search', seconds)
+    # The second batch rotated the first into the backup.
+    assert (tmp_path / 'spans.jsonl.1').exists()
+    assert Tracer(str(tmp_path / 'spans.jsonl')).histograms()['search'].count == 4
+
+
+def test_reset(tmp_path):
+    tracer = Tracer(str(tmp_path / 'spans.jsonl'), max_bytes=10, flush_every=2)
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        tracer.record('search', seconds)
+    tracer.reset()
+    assert list(tmp_path.iterdir()) == []
+    assert tracer.histograms() == {}
+
+
+def test_spans_only_recorded_while_enabled(tmp_path):
+    path = str(tmp_path / 'spans.jsonl')
+    assert tracing.span('search') is NO_SPAN
+    tracer = tracing.enable(path)
+    try:
+        assert tracing.enable(path) is tracer
+        with tracing.span('search'):
+            pass
+    finally:
+        tracing.disable()
+    assert not tracing.enabled()
+    with tracing.span('search'):
+        pass
+    assert Tracer(path).histograms()['search'].count == 1
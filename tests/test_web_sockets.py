@@ -0,0 +1,155 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from cider_api.cider import Cider
+from cider_api.web_sockets import ConnectionPool, WebSocket
+
+
+def status(ws: WebSocket, id: str = 'x'):
+    return ws.send({'action': 'library-status', 'type': 'songs', 'id': id}, 'libraryStatus')
+
+
+def test_send_over_one_connection(mock_cider):
+    with WebSocket('127.0.0.1', mock_cider.port) as ws:
+        assert status(ws)['data'] == {'inLibrary': False, 'rating': 0}
+        assert ws.send({'action': 'play'})['type'] == 'generic'
+
+
+def test_replies_matched_by_type(mock_cider):
+    with WebSocket('127.0.0.1', mock_cider.port) as ws:
+        playing = ws.submit({'action': 'get-currentmediaitem'}, 'playbackStateUpdate')
+        library = ws.submit({'action': 'library-status', 'id': 'x'}, 'libraryStatus')
+        assert ws.result(library, 5)['type'] == 'libraryStatus'
+        assert playing.done
+        assert ws.result(playing, 5)['type'] == 'playbackStateUpdate'
+
+
+def test_requests_dropped_by_reconnect_fail_fast(mock_cider):
+    with WebSocket('127.0.0.1', mock_cider.port) as ws:
+        first = ws.submit({'action': 'library-status', 'id': 'a'}, 'libraryStatus')
+        # The next send fails and reconnects, losing the first reply.
+        ws._ws.sock.shutdown(socket.SHUT_WR)
+        second = ws.submit({'action': 'library-status', 'id': 'b'}, 'libraryStatus')
+        start = time.monotonic()
+        with pytest.raises(ConnectionError):
+            ws.result(first, 5)
+        assert time.monotonic() - start < 1
+        assert ws.result(second, 5)['type'] == 'libraryStatus'
+
+
+def test_read_timeout_is_not_left_on_the_socket(mock_cider):
+    with WebSocket('127.0.0.1', mock_cider.port) as ws:
+        timeout = ws._ws.gettimeout()
+        status(ws)
+        assert ws._ws.gettimeout() == timeout
+
+
+def test_pool_reuses_connections(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=2)
+    with pool.connection(1) as first:
+        status(first)
+    with pool.connection(1) as again:
+        assert again is first
+    assert pool.stats['opened'] == 1
+    pool.close()
+
+
+def test_pool_checkout_times_out_when_full(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=1)
+    held = pool.checkout(1)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        pool.checkout(0.1)
+    assert 0.1 <= time.monotonic() - start < 1
+    pool.checkin(held)
+    assert pool.checkout(0.1) is held
+
+
+def test_pool_hands_connections_over_in_order(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=1)
+    held = pool.checkout(1)
+    order = []
+
+    def wait(name):
+        connection = pool.checkout(5)
+        order.append(name)
+        pool.checkin(connection)
+
+    threads = []
+    for name in ('first', 'second', 'third'):
+        threads.append(threading.Thread(target=wait, args=(name,)))
+        threads[-1].start()
+        time.sleep(0.05)
+    pool.checkin(held)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['first', 'second', 'third']
+    assert pool.stats['waited'] == 3
+
+
+def test_pool_evicts_idle_connections(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=1, max_idle=0.05)
+    with pool.connection(1) as first:
+        status(first)
+    time.sleep(0.1)
+    with pool.connection(1) as second:
+        assert second is not first
+        assert not first.connected
+    assert pool.stats['evicted'] == 1
+
+
+def test_pool_reopens_closed_connections(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=1)
+    with pool.connection(1) as ws:
+        status(ws)
+        ws._ws.sock.shutdown(socket.SHUT_RD)
+    with pool.connection(1) as ws:
+        assert status(ws)['type'] == 'libraryStatus'
+    assert pool.stats['reconnected'] == 1
+
+
+def test_pool_close_wakes_waiters(mock_cider):
+    pool = ConnectionPool('127.0.0.1', mock_cider.port, size=1)
+    held = pool.checkout(1)
+    errors = []
+
+    def wait():
+        try:
+            pool.checkout(5)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+    pool.close()
+    thread.join(1)
+    assert len(errors) == 1
+    pool.checkin(held)
+    assert not held.connected
+
+
+def test_cider_actions_from_many_threads(mock_cider):
+    cider = Cider(port=mock_cider.port, pool_size=3)
+    errors = []
+
+    def rate(i):
+        try:
+            id = f'song-{i}'
+            cider.rate('songs', id, 1 if i % 2 else -1)
+            reply = cider._action('library-status', type='songs', id=id)
+            assert reply['data']['rating'] == (1 if i % 2 else -1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rate, args=(i,)) for i in range(60)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == []
+    assert cider._pool.stats['opened'] <= 3
+    cider.close()